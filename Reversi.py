@@ -4,8 +4,138 @@
     Certaines parties de ce code sont fortement inspirée de 
     https://inventwithpython.com/chapter15.html
 
+    Deux representations du plateau sont disponibles : Board (liste de listes)
+    et BitBoard (deux entiers, un bit par case), choisie avec le drapeau
+    bitboard du constructeur : Board(8, bitboard=True).
+
     '''
 
+import logging
+import random
+
+logger = logging.getLogger(__name__)
+
+_DIRECTIONS = [[0, 1], [1, 1], [1, 0], [1, -1],
+               [0, -1], [-1, -1], [-1, 0], [-1, 1]]
+
+# Shift amounts and wrap masks, computed once per board size
+_bitboard_shifts = {}
+# Zobrist keys, computed once per board size
+_zobrist_keys = {}
+# Squares sharing a row, column or diagonal with each square, per board size
+_board_lines = {}
+
+
+def _get_board_lines(size):
+    """
+    Return lines such that lines[x][y] is the set of squares lying on a ray
+    from (x, y), (x, y) included. A move changing the discs in (x, y) can only
+    change the legality of the empty squares in this set.
+    """
+    if size not in _board_lines:
+        lines = []
+        for x in range(size):
+            lines.append([])
+            for y in range(size):
+                squares = {(x, y)}
+                for dx, dy in _DIRECTIONS:
+                    i, j = x + dx, y + dy
+                    while 0 <= i < size and 0 <= j < size:
+                        squares.add((i, j))
+                        i, j = i + dx, j + dy
+                lines[x].append(frozenset(squares))
+        _board_lines[size] = lines
+    return _board_lines[size]
+
+
+def _get_bitboard_shifts(size):
+    """
+    Return (full_mask, left_shifts, right_shifts) for a size x size bitboard.
+    Square (x, y) is bit x*size+y. Each shift list holds (amount, mask) pairs,
+    the mask removing squares that wrapped around a board edge.
+    """
+    if size not in _bitboard_shifts:
+        full = (1 << size * size) - 1
+        first_col, last_col = 0, 0
+        for x in range(size):
+            first_col |= 1 << (x * size)
+            last_col |= 1 << (x * size + size - 1)
+        left, right = [], []
+        for dx, dy in _DIRECTIONS:
+            shift = dx * size + dy
+            mask = full
+            if dy == 1:
+                mask &= ~first_col
+            elif dy == -1:
+                mask &= ~last_col
+            if shift > 0:
+                left.append((shift, mask))
+            else:
+                right.append((-shift, mask))
+        _bitboard_shifts[size] = (full, left, right)
+    return _bitboard_shifts[size]
+
+
+def _get_zobrist_keys(size):
+    """
+    Return (keys, flip_keys, side_key) for Zobrist hashing on a size x size board:
+    keys[player][x*size+y] for a disc of player in (x, y), flip_keys[i] to flip
+    the disc in square i, and side_key, xored in when white is to play.
+    Keys are drawn from a fixed seed so that hashes are the same in every process.
+    """
+    if size not in _zobrist_keys:
+        rng = random.Random(size)
+        keys = [[0] * (size * size)]
+        for _player in (Board._BLACK, Board._WHITE):
+            keys.append([rng.getrandbits(64) for _ in range(size * size)])
+        flip_keys = [b ^ w for b, w in zip(keys[Board._BLACK], keys[Board._WHITE])]
+        _zobrist_keys[size] = (keys, flip_keys, rng.getrandbits(64))
+    return _zobrist_keys[size]
+
+
+def bitboard_moves(own, opp, size):
+    "Bitmask of the legal moves for the player owning own discs against opp discs"
+    full, left, right = _get_bitboard_shifts(size)
+    moves = 0
+    for shift, mask in left:
+        frontier = (own << shift) & mask & opp
+        reached = frontier
+        while frontier:
+            frontier = (frontier << shift) & mask & opp
+            reached |= frontier
+        moves |= (reached << shift) & mask
+    for shift, mask in right:
+        frontier = (own >> shift) & mask & opp
+        reached = frontier
+        while frontier:
+            frontier = (frontier >> shift) & mask & opp
+            reached |= frontier
+        moves |= (reached >> shift) & mask
+    return moves & ~(own | opp) & full
+
+
+def bitboard_flips(own, opp, square, size):
+    "Bitmask of the opp discs flipped when own plays on square (a single bit)"
+    _full, left, right = _get_bitboard_shifts(size)
+    flips = 0
+    for shift, mask in left:
+        line = 0
+        x = (square << shift) & mask
+        while x & opp:
+            line |= x
+            x = (x << shift) & mask
+        if x & own:
+            flips |= line
+    for shift, mask in right:
+        line = 0
+        x = (square >> shift) & mask
+        while x & opp:
+            line |= x
+            x = (x >> shift) & mask
+        if x & own:
+            flips |= line
+    return flips
+
 
 class Board:
     _BLACK = 1
@@ -13,8 +143,14 @@ class Board:
     _EMPTY = 0
     _LIMIT = -1
 
+    def __new__(cls, board_size=8, bitboard=False):
+        # Board(size, bitboard=True) builds the bitboard backend
+        if bitboard and cls is Board:
+            cls = BitBoard
+        return super().__new__(cls)
+
     # Attention, la taille du plateau est donnée en paramètre
-    def __init__(self, board_size=8):
+    def __init__(self, board_size=8, bitboard=False):
         self._nbWHITE = 2
         self._nbBLACK = 2
         self._nextPlayer = self._BLACK
@@ -30,9 +166,13 @@ class Board:
 
         self._stack = []
         self._successivePass = 0
+        # Legal moves (without pass) of each player for the current position,
+        # saved in the stack on push and restored on pop
+        self._legal_cache = {}
+        self._hash = self._compute_hash()
 
     def reset(self):
-        self.__init__()
+        self.__init__(self._boardsize)
 
     def get_board_size(self):
         "Return board size"
@@ -41,6 +181,34 @@ class Board:
     def get_board(self):
         return self._board
 
+    def get_hash(self):
+        "Zobrist hash of the position (discs and player to play), updated on push/pop"
+        return self._hash
+
+    def _compute_hash(self):
+        keys, _flip_keys, side_key = _get_zobrist_keys(self._boardsize)
+        h = side_key if self._nextPlayer == self._WHITE else 0
+        black, white = self.get_bitboards()
+        for i in range(self._boardsize * self._boardsize):
+            if (black >> i) & 1:
+                h ^= keys[self._BLACK][i]
+            elif (white >> i) & 1:
+                h ^= keys[self._WHITE][i]
+        return h
+
+    def get_bitboards(self):
+        "Return the position as two integers (black, white), square (x, y) being bit x*size+y"
+        black, white = 0, 0
+        bit = 1
+        for line in self._board:
+            for c in line:
+                if c == self._BLACK:
+                    black |= bit
+                elif c == self._WHITE:
+                    white |= bit
+                bit <<= 1
+        return black, white
+
     def get_next_player(self):
         return self._nextPlayer
 
@@ -78,7 +246,7 @@ class Board:
         inspired by https://inventwithpython.com/chapter15.html
         """
         if self._board[xstart][ystart] != self._EMPTY or not self._isOnBoard(xstart, ystart):
-            print("ILLEGAL MOVE")
+            logger.warning("ILLEGAL MOVE")
             return False
 
         # On pourra remettre _EMPTY ensuite
@@ -88,7 +256,7 @@ class Board:
 
         # Si au moins un coup est valide, on collecte ici toutes les pieces a retourner
         tilesToFlip = []
-        for xdirection, ydirection in [[0, 1], [1, 1], [1, 0], [1, -1], [0, -1], [-1, -1], [-1, 0], [-1, 1]]:
+        for xdirection, ydirection in _DIRECTIONS:
             x, y = xstart, ystart
             x += xdirection
             y += ydirection
@@ -134,7 +302,7 @@ class Board:
 
         otherPlayer = self._flip(player)
 
-        for xdirection, ydirection in [[0, 1], [1, 1], [1, 0], [1, -1], [0, -1], [-1, -1], [-1, 0], [-1, 1]]:
+        for xdirection, ydirection in _DIRECTIONS:
             x, y = xstart, ystart
             x += xdirection
             y += ydirection
@@ -192,21 +360,31 @@ class Board:
         [player, x, y] = move
         # print("player", player, "next", self._nextPlayer)
         assert player == self._nextPlayer
+        keys, flip_keys, side_key = _get_zobrist_keys(self._boardsize)
         if x == -1 and y == -1:  # pass
+            # Discs do not change, neither do the legal moves
             self._nextPlayer = self._flip(player)
-            self._stack.append([move, self._successivePass, []])
+            self._stack.append(
+                [move, self._successivePass, [], self._legal_cache, self._hash])
             self._successivePass += 1
+            self._hash ^= side_key
             return
 
         toflip = self.testAndBuild_ValidMove(player, x, y)
         assert toflip != False
 
-        self._stack.append([move, self._successivePass, toflip])
+        self._stack.append(
+            [move, self._successivePass, toflip, self._legal_cache, self._hash])
+        self._legal_cache = {}
         self._successivePass = 0
         self._board[x][y] = player
 
+        size = self._boardsize
+        h = self._hash ^ side_key ^ keys[player][x * size + y]
         for xf, yf in toflip:
             self._board[xf][yf] = self._flip(self._board[xf][yf])
+            h ^= flip_keys[xf * size + yf]
+        self._hash = h
 
         if player == self._BLACK:
             self._nbBLACK += 1 + len(toflip)
@@ -219,7 +397,8 @@ class Board:
 
     def pop(self):
         "Cancel last move on board"
-        [move, self._successivePass, toflip] = self._stack.pop()
+        [move, self._successivePass, toflip,
+            self._legal_cache, self._hash] = self._stack.pop()
         [player, x, y] = move
         self._nextPlayer = player
         if len(toflip) == 0:  # pass
@@ -237,11 +416,7 @@ class Board:
 
     def at_least_one_legal_move(self, player):
         "Can we play at least on move?"
-        for x in range(0, self._boardsize):
-            for y in range(0, self._boardsize):
-                if self.lazyTest_ValidMove(player, x, y):
-                    return True
-        return False
+        return len(self._get_legal_moves(player)) > 0
 
     def legal_moves(self, player="default"):
         'Get all possible plays for current player if player="default"'
@@ -249,13 +424,47 @@ class Board:
             player = self._nextPlayer
         else:
             player = self._flip(self._nextPlayer)
+        moves = self._get_legal_moves(player)
+        if len(moves) == 0:
+            return [[player, -1, -1]]  # We shall pass
+        return list(moves)
+
+    def _get_legal_moves(self, player):
+        "Legal moves of player (pass excluded), memoized for the current position"
+        moves = self._legal_cache.get(player)
+        if moves is None:
+            moves = self._compute_legal_moves(player)
+            self._legal_cache[player] = moves
+        return moves
+
+    def _compute_legal_moves(self, player):
+        if self._stack:
+            [move, _, toflip, parent_cache, _] = self._stack[-1]
+            parent_moves = parent_cache.get(player)
+            if parent_moves is not None and toflip:
+                return self._update_legal_moves(player, parent_moves, move, toflip)
         moves = []
         for x in range(0, self._boardsize):
             for y in range(0, self._boardsize):
                 if self.lazyTest_ValidMove(player, x, y):
                     moves.append([player, x, y])
-        if len(moves) is 0:
-            moves = [[player, -1, -1]]  # We shall pass
+        return moves
+
+    def _update_legal_moves(self, player, parent_moves, move, toflip):
+        """
+        Legal moves of player after move, from its legal moves before move:
+        only the squares on a ray through a changed disc need a new test
+        """
+        lines = _get_board_lines(self._boardsize)
+        [_, x, y] = move
+        changed = set(lines[x][y])
+        for xf, yf in toflip:
+            changed |= lines[xf][yf]
+        moves = [m for m in parent_moves if (m[1], m[2]) not in changed]
+        for (x, y) in changed:
+            if self._board[x][y] == self._EMPTY and self.lazyTest_ValidMove(player, x, y):
+                moves.append([player, x, y])
+        moves.sort()
         return moves
 
     # Exemple d'heuristique tres simple : compte simplement les pieces
@@ -275,16 +484,170 @@ class Board:
             return '.'
 
     def __str__(self):
-        toreturn = ""
-        for l in self._board:
-            for c in l:
-                toreturn += self._piece2str(c)
-            toreturn += "\n"
-        toreturn += "Next player: " + \
-            ("BLACK" if self._nextPlayer == self._BLACK else "WHITE") + "\n"
-        toreturn += str(self._nbBLACK) + " blacks and " + \
-            str(self._nbWHITE) + " whites on board\n"
-        toreturn += "(successive pass: " + str(self._successivePass) + " )"
-        return toreturn
+        lines = ["".join(self._piece2str(c) for c in l) for l in self._board]
+        lines.append("Next player: " +
+                     ("BLACK" if self._nextPlayer == self._BLACK else "WHITE"))
+        lines.append(f"{self._nbBLACK} blacks and {self._nbWHITE} whites on board")
+        lines.append(f"(successive pass: {self._successivePass} )")
+        return "\n".join(lines)
 
     __repr__ = __str__
+
+
+class BitBoard(Board):
+    """
+    Same rules and API as Board, but the position is kept as two integers
+    (one bit per square, square (x, y) being bit x*size+y). Legal moves and
+    flips are computed with shifts and masks instead of walking the grid.
+    """
+
+    def __init__(self, board_size=8, bitboard=True):
+        self._nbWHITE = 2
+        self._nbBLACK = 2
+        self._nextPlayer = self._BLACK
+        self._boardsize = board_size
+        _middle = int(self._boardsize / 2)
+        # Indexed by player: [unused, black discs, white discs]
+        self._bits = [0, 0, 0]
+        self._bits[self._BLACK] = self._bit(_middle-1, _middle-1) | \
+            self._bit(_middle, _middle)
+        self._bits[self._WHITE] = self._bit(_middle-1, _middle) | \
+            self._bit(_middle, _middle-1)
+        self._grid = None
+
+        self._stack = []
+        self._successivePass = 0
+        self._legal_cache = {}
+        self._hash = self._compute_hash()
+
+    def _bit(self, x, y):
+        return 1 << (x * self._boardsize + y)
+
+    @property
+    def _board(self):
+        "List of lists view of the position, rebuilt lazily after each push/pop (read only)"
+        if self._grid is None:
+            size = self._boardsize
+            black, white = self._bits[self._BLACK], self._bits[self._WHITE]
+            self._grid = []
+            for x in range(size):
+                line = []
+                for y in range(size):
+                    bit = 1 << (x * size + y)
+                    if black & bit:
+                        line.append(self._BLACK)
+                    elif white & bit:
+                        line.append(self._WHITE)
+                    else:
+                        line.append(self._EMPTY)
+                self._grid.append(line)
+        return self._grid
+
+    def get_bitboards(self):
+        return self._bits[self._BLACK], self._bits[self._WHITE]
+
+    def _legal_mask(self, player):
+        return bitboard_moves(self._bits[player], self._bits[self._flip(player)], self._boardsize)
+
+    def _flips(self, player, x, y):
+        "Flipped discs mask if player plays in (x, y), 0 if the move is not valid"
+        if not self._isOnBoard(x, y):
+            return 0
+        square = self._bit(x, y)
+        own, opp = self._bits[player], self._bits[self._flip(player)]
+        if (own | opp) & square:
+            return 0
+        return bitboard_flips(own, opp, square, self._boardsize)
+
+    def testAndBuild_ValidMove(self, player, xstart, ystart):
+        if not self._isOnBoard(xstart, ystart) or \
+                (self._bits[self._BLACK] | self._bits[self._WHITE]) & self._bit(xstart, ystart):
+            logger.warning("ILLEGAL MOVE")
+            return False
+        flips = self._flips(player, xstart, ystart)
+        if flips == 0:
+            return False
+        return [[i // self._boardsize, i % self._boardsize] for i in self._bit_indexes(flips)]
+
+    def lazyTest_ValidMove(self, player, xstart, ystart):
+        return self._flips(player, xstart, ystart) != 0
+
+    def _bit_indexes(self, mask):
+        "Indexes of the set bits of mask, in increasing order"
+        indexes = []
+        while mask:
+            low = mask & -mask
+            indexes.append(low.bit_length() - 1)
+            mask ^= low
+        return indexes
+
+    def push(self, move):
+        "Play the move on board"
+        [player, x, y] = move
+        assert player == self._nextPlayer
+        self._grid = None
+        keys, flip_keys, side_key = _get_zobrist_keys(self._boardsize)
+        if x == -1 and y == -1:  # pass
+            self._nextPlayer = self._flip(player)
+            self._stack.append(
+                [move, self._successivePass, 0, self._legal_cache, self._hash])
+            self._successivePass += 1
+            self._hash ^= side_key
+            return
+
+        flips = self._flips(player, x, y)
+        assert flips != 0
+
+        self._stack.append(
+            [move, self._successivePass, flips, self._legal_cache, self._hash])
+        self._legal_cache = {}
+        self._successivePass = 0
+        h = self._hash ^ side_key ^ keys[player][x * self._boardsize + y]
+        for i in self._bit_indexes(flips):
+            h ^= flip_keys[i]
+        self._hash = h
+        opponent = self._flip(player)
+        self._bits[player] |= flips | self._bit(x, y)
+        self._bits[opponent] ^= flips
+
+        nb_flips = bin(flips).count("1")
+        if player == self._BLACK:
+            self._nbBLACK += 1 + nb_flips
+            self._nbWHITE -= nb_flips
+        else:
+            self._nbWHITE += 1 + nb_flips
+            self._nbBLACK -= nb_flips
+        self._nextPlayer = opponent
+
+    def pop(self):
+        "Cancel last move on board"
+        [move, self._successivePass, flips,
+            self._legal_cache, self._hash] = self._stack.pop()
+        [player, x, y] = move
+        self._nextPlayer = player
+        self._grid = None
+        if flips == 0:  # pass
+            assert x == -1 and y == -1
+            return
+        self._bits[player] ^= flips | self._bit(x, y)
+        self._bits[self._flip(player)] |= flips
+        nb_flips = bin(flips).count("1")
+        if player == self._BLACK:
+            self._nbBLACK -= 1 + nb_flips
+            self._nbWHITE += nb_flips
+        else:
+            self._nbWHITE -= 1 + nb_flips
+            self._nbBLACK += nb_flips
+
+    def at_least_one_legal_move(self, player):
+        "Can we play at least on move?"
+        moves = self._legal_cache.get(player)
+        if moves is not None:
+            return len(moves) > 0
+        # Cheaper than decoding the moves
+        return self._legal_mask(player) != 0
+
+    def _compute_legal_moves(self, player):
+        size = self._boardsize
+        return [[player, i // size, i % size]
+                for i in self._bit_indexes(self._legal_mask(player))]
@@ -0,0 +1,170 @@
+import logging
+import math
+import multiprocessing
+import time
+import Reversi
+from main import play, quiet, load_mcts
+from players.MCTSPlayer import MCTSPlayer
+
+logger = logging.getLogger(__name__)
+
+
+class PlayerSpec:
+    """
+    Picklable description of a player, built in each worker by factory(color, **kwargs).
+    factory must be picklable too (a class or a function of a module).
+
+    Arguments:
+        factory: Player class or function returning a player
+        name: Name of the player in the results (default: factory name)
+    """
+
+    def __init__(self, factory, name=None, **kwargs):
+        self.factory = factory
+        self.name = name or factory.__name__
+        self.kwargs = kwargs
+
+    def build(self, color):
+        return self.factory(color, **self.kwargs)
+
+
+def mcts_player(color, mcts_path, **kwargs):
+    "MCTSPlayer with the MCTS saved in mcts_path, for PlayerSpec(mcts_player, mcts_path=...)"
+    return MCTSPlayer(color, load_mcts(mcts_path), **kwargs)
+
+
+def wilson_interval(successes, n, z=1.96):
+    "Wilson score confidence interval of a proportion (95% for z=1.96)"
+    if n == 0:
+        return (0., 1.)
+    p = successes / n
+    centre = (p + z**2 / (2 * n)) / (1 + z**2 / n)
+    half_width = z * math.sqrt(p * (1 - p) / n + z**2 / (4 * n**2)) / (1 + z**2 / n)
+    return (max(0., centre - half_width), min(1., centre + half_width))
+
+
+# Specs, board and players of the worker process, see _init_worker
+_worker = {}
+
+
+def _init_worker(specs, board_size, bitboard, seed):
+    _worker["specs"] = specs
+    _worker["board_size"] = board_size
+    _worker["bitboard"] = bitboard
+    _worker["seed"] = seed
+    _worker["players"] = {}
+
+
+def _get_player(index, color, game):
+    """
+    Player of spec index, built once per worker and reused for each game.
+    With a tournament seed, players with a seed method are seeded for each
+    game, so that a game does not depend on the games the worker played before.
+    """
+    players = _worker["players"]
+    if index not in players:
+        players[index] = _worker["specs"][index].build(color)
+    player = players[index]
+    if _worker["seed"] is not None and hasattr(player, "seed"):
+        player.seed((_worker["seed"] << 32) + 2 * game + index)
+    player.newGame(color)
+    return player
+
+
+def _close_players():
+    "Close the players of this process (the ones of pool workers end with them)"
+    for player in _worker["players"].values():
+        player.close()
+    _worker["players"] = {}
+
+
+def _play_game(game):
+    """
+    Play game number game: the first player is black in even games, white in odd ones.
+    Return (game, index of the winner spec or None for a tie, duration).
+    """
+    colors = (Reversi.Board._BLACK, Reversi.Board._WHITE) if game % 2 == 0 else \
+        (Reversi.Board._WHITE, Reversi.Board._BLACK)
+    player1, player2 = _get_player(0, colors[0], game), _get_player(1, colors[1], game)
+    board = Reversi.Board(_worker["board_size"], bitboard=_worker["bitboard"])
+    start = time.time()
+    with quiet():
+        winner = play(player1, player2, board)
+        player1.endGame(winner)
+        player2.endGame(winner)
+    if winner in colors:
+        return game, colors.index(winner), time.time() - start
+    return game, None, time.time() - start
+
+
+class Tournament:
+    """
+    Plays games between two players, spread over a pool of worker processes.
+    Each worker builds its own players from their PlayerSpec and reuses them
+    for all its games. Players colours alternate: player1 is black in even
+    games and white in odd ones.
+
+    Pool workers cannot start processes, so players searching in parallel
+    (n_workers > 1) can only be used with n_workers=1 here. Both players of a
+    game run in the same worker, so pondering (ponder=True) does not give a
+    player more time: its background search takes time from the opponent.
+
+    Arguments:
+        player1, player2: PlayerSpec of the players
+        board_size: Size of the board
+        bitboard: Board backend of the referee
+        n_workers: Number of processes (None for the number of cores, 1 to play in this process)
+        seed: Seed of the players of each game (None to leave them unseeded), for
+            reproducible tournaments with players using a WorkTimer budget
+    """
+
+    def __init__(self, player1, player2, board_size=8, bitboard=False, n_workers=None, seed=None):
+        self.specs = (player1, player2)
+        self.seed = seed
+        self.board_size = board_size
+        self.bitboard = bitboard
+        self.n_workers = n_workers or multiprocessing.cpu_count()
+
+    def run(self, n_games):
+        """
+        Play n_games games, logging each result as soon as the game ends.
+        Return a dict with the wins of each player, the ties, their 95%
+        confidence intervals, the results of each game and the total time.
+        """
+        start = time.time()
+        names = [spec.name for spec in self.specs]
+        results = [None] * n_games
+        initargs = (self.specs, self.board_size, self.bitboard, self.seed)
+        if self.n_workers == 1:
+            _init_worker(*initargs)
+            finished = map(_play_game, range(n_games))
+            pool = None
+        else:
+            pool = multiprocessing.Pool(self.n_workers, _init_worker, initargs)
+            finished = pool.imap_unordered(_play_game, range(n_games))
+        try:
+            for n_finished, (game, winner, duration) in enumerate(finished, 1):
+                results[game] = winner
+                logger.info("End of game %d (%d/%d) winner: %s, took %.1f s", game + 1, n_finished,
+                            n_games, "tie" if winner is None else names[winner], duration)
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+            else:
+                _close_players()
+
+        wins = [results.count(0), results.count(1)]
+        ties = results.count(None)
+        report = {"names": names, "wins": wins, "ties": ties,
+                  "wins_intervals": [wilson_interval(w, n_games) for w in wins],
+                  "ties_interval": wilson_interval(ties, n_games),
+                  "results": results, "time": time.time() - start}
+        if n_games > 0 and logger.isEnabledFor(logging.INFO):
+            logger.info("End of %d games in %.1f s\n%s", n_games, report["time"], "-"*50)
+            counts = list(zip(names, wins, report["wins_intervals"]))
+            counts.append(("Ties", ties, report["ties_interval"]))
+            for name, count, (low, high) in counts:
+                logger.info("%s: %d (%.1f%%, 95%% CI [%.1f%%, %.1f%%])", name, count,
+                            100 * count / n_games, 100 * low, 100 * high)
+        return report
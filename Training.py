@@ -0,0 +1,164 @@
+import glob
+import json
+import logging
+import math
+import multiprocessing
+import os
+import random
+import time
+import Reversi
+from players.MCTSPlayer import MCTS
+
+logger = logging.getLogger(__name__)
+
+_STATISTICS = ("visits", "values", "values_sq")
+
+
+def _self_play(path, n_iterations, board_size, bitboard, seed):
+    """
+    Worker: train the MCTS of checkpoint path for n_iterations from the start
+    position. Return it with the statistics of the checkpoint subtracted, so
+    that it only holds the iterations added, to be merged in the master tree.
+    Only the nodes visited by these iterations are sent back, with all the
+    children of the nodes they expanded (the master adds them all).
+    """
+    mcts = MCTS.load(path, mmap_mode=None, seed=seed)
+    tree = mcts.get_tree()
+    n_base = len(tree)
+    base = [getattr(tree, name)[:n_base].copy() for name in _STATISTICS]
+    mcts.train(Reversi.Board(board_size, bitboard=bitboard), n_iterations, verbose=False)
+    # The arrays are reallocated when the tree grows
+    tree = mcts.get_tree()
+    for name, array in zip(_STATISTICS, base):
+        getattr(tree, name)[:n_base] -= array
+    # Nodes are appended to the tree: the ones after n_base are children of the expanded nodes
+    keep = tree.visits[:len(tree)] > 0
+    keep[n_base:] = True
+    mcts._tree = tree.filtered(keep)
+    mcts._root = mcts._tree.root
+    mcts._n_simulations = n_iterations
+    return mcts
+
+
+def latest_checkpoint(checkpoint_dir):
+    "Path of the last checkpoint of checkpoint_dir, None if there is none"
+    paths = sorted(glob.glob(os.path.join(checkpoint_dir, "checkpoint_*.mcts")))
+    return paths[-1] if paths else None
+
+
+class Trainer:
+    """
+    Resumable self-play training of an MCTS from the start position.
+
+    Training runs in rounds. In each round, every worker process loads the
+    last checkpoint, runs round_iterations iterations and sends back the
+    statistics it added, which are merged in the master tree (the same
+    iterations run in this process when n_workers is 1). The master tree is
+    then checkpointed, so that a crash loses one round at most: checkpoints
+    are written to a temporary file renamed over the final one, so the last
+    checkpoint is always complete. A new Trainer resumes from the last
+    checkpoint of checkpoint_dir.
+
+    The metrics of each round (iterations, iterations per second, nodes and
+    memory of the tree) are logged and appended to metrics.jsonl in checkpoint_dir.
+
+    Arguments:
+        checkpoint_dir: Directory of the checkpoints, created if needed
+        board_size: Size of the board
+        bitboard: Board backend of the games
+        n_workers: Number of processes (None for the number of cores, 1 to train in this process)
+        round_iterations: Iterations of each worker per round
+        keep: Number of checkpoints kept, the older ones are deleted
+        max_nodes: Node budget of the master tree, pruned after each round (None for no limit)
+        seed: Seed of the random generators
+        mcts_kwargs: Parameters of the MCTS when there is no checkpoint to resume
+    """
+    METRICS_FILE = "metrics.jsonl"
+
+    def __init__(self, checkpoint_dir="mcts_save/checkpoints", board_size=8, bitboard=False,
+                 n_workers=None, round_iterations=1000, keep=3, max_nodes=None, seed=None,
+                 **mcts_kwargs):
+        self.checkpoint_dir = checkpoint_dir
+        self.board_size = board_size
+        self.bitboard = bitboard
+        self.n_workers = n_workers or multiprocessing.cpu_count()
+        self.round_iterations = round_iterations
+        self.keep = keep
+        self.max_nodes = max_nodes
+        self._rng = random.Random(seed)
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        path = latest_checkpoint(checkpoint_dir)
+        if path is not None:
+            self.mcts = MCTS.load(path, mmap_mode=None, seed=self._seed())
+            if self.mcts.board_size != board_size:
+                raise ValueError(f"{path} is a tree of size {self.mcts.board_size}, expected {board_size}")
+            logger.info("Resuming from %s, %d iterations", path, self.mcts.get_n_simulations())
+        else:
+            self.mcts = MCTS(seed=self._seed(), board_size=board_size, **mcts_kwargs)
+        self.metrics = []
+
+    def _seed(self):
+        return self._rng.getrandbits(32)
+
+    def checkpoint(self):
+        "Save the master tree as the last checkpoint and delete the old ones. Return its path"
+        path = os.path.join(self.checkpoint_dir,
+                            f"checkpoint_{self.mcts.get_n_simulations():012d}.mcts")
+        tmp_path = path + ".tmp"
+        self.mcts.save(tmp_path)
+        os.replace(tmp_path, path)
+        paths = sorted(glob.glob(os.path.join(self.checkpoint_dir, "checkpoint_*.mcts")))
+        for old_path in paths[:-self.keep]:
+            os.remove(old_path)
+        return path
+
+    def run(self, total_iterations, max_time=None):
+        """
+        Train until the tree has total_iterations iterations (counting the ones
+        of the resumed checkpoint), or for max_time seconds. Return the metrics of the rounds.
+        """
+        start = time.time()
+        pool = None
+        if self.n_workers > 1:
+            pool = multiprocessing.Pool(self.n_workers)
+            path = latest_checkpoint(self.checkpoint_dir)
+            if path is None or MCTS.load(path).get_n_simulations() != self.mcts.get_n_simulations():
+                path = self.checkpoint()
+        try:
+            while self.mcts.get_n_simulations() < total_iterations:
+                if max_time is not None and time.time() - start >= max_time:
+                    break
+                remaining = total_iterations - self.mcts.get_n_simulations()
+                n_iterations = min(self.round_iterations, math.ceil(remaining / self.n_workers))
+                round_start = time.time()
+                if pool is None:
+                    self.mcts.train(Reversi.Board(self.board_size, bitboard=self.bitboard),
+                                    n_iterations, verbose=False)
+                else:
+                    tasks = [(path, n_iterations, self.board_size, self.bitboard, self._seed())
+                             for _ in range(self.n_workers)]
+                    for added in pool.starmap(_self_play, tasks):
+                        self.mcts.merge(added)
+                if self.max_nodes is not None:
+                    self.mcts.prune(self.max_nodes)
+                path = self.checkpoint()
+                self._record_round(n_iterations * self.n_workers, time.time() - round_start)
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+        return self.metrics
+
+    def _record_round(self, n_iterations, elapsed):
+        tree = self.mcts.get_tree()
+        metrics = {"iterations": self.mcts.get_n_simulations(),
+                   "round_iterations": n_iterations,
+                   "iterations_per_second": n_iterations / max(elapsed, 1e-9),
+                   "nodes": len(tree), "memory_bytes": tree.nbytes(),
+                   "time": time.time()}
+        self.metrics.append(metrics)
+        with open(os.path.join(self.checkpoint_dir, self.METRICS_FILE), "a") as file:
+            file.write(json.dumps(metrics) + "\n")
+        logger.info("%d iterations, %.0f iterations/s, %d nodes, %.1f MB",
+                    metrics["iterations"], metrics["iterations_per_second"], metrics["nodes"],
+                    metrics["memory_bytes"] / 2**20)
@@ -0,0 +1,212 @@
+"""
+Benchmarks of the board, the heuristics and the searches on the positions of
+positions.json (recorded opening, midgame and endgame positions).
+
+Run from the repository root:
+    python -m benchmarks.bench --output results.json
+    python -m benchmarks.bench --save-baseline benchmarks/baseline.json
+    python -m benchmarks.bench --baseline benchmarks/baseline.json --tolerance 0.2
+
+Results are written as JSON: {"meta": {...}, "results": {name: {"value", "unit"}}},
+all values being higher for better performance. With --baseline, the run
+exits with status 1 when a value is more than tolerance below the baseline.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import time
+from copy import deepcopy
+import Reversi
+from main import quiet
+from players.AlphaBetaPlayer import AlphaBetaPlayer
+from players.Heuristics import Heuristics, BitboardHeuristics
+from players.MCTSPlayer import MCTS
+from players.Timer import FixedTimer
+
+logger = logging.getLogger(__name__)
+
+POSITIONS_PATH = os.path.join(os.path.dirname(__file__), "positions.json")
+PHASES = ("opening", "midgame", "endgame")
+
+
+def load_positions(path=POSITIONS_PATH, bitboard=False):
+    "(name, phase, board) of each position of the corpus"
+    with open(path) as file:
+        corpus = json.load(file)
+    positions = []
+    for entry in corpus:
+        board = Reversi.Board(8, bitboard=bitboard)
+        for x, y in entry["moves"]:
+            board.push([board.get_next_player(), x, y])
+        positions.append((entry["name"], entry["phase"], board))
+    return positions
+
+
+def _rate(function, items, duration):
+    "Calls of function(item) per second, each item of items being used for duration / len(items) s"
+    calls, elapsed = 0, 0.
+    for item in items:
+        start = time.perf_counter()
+        deadline = start + duration / len(items)
+        while True:
+            # Check the time every 10 calls only
+            for _ in range(10):
+                function(item)
+            calls += 10
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+        elapsed += now - start
+    return calls / elapsed
+
+
+def _legal_moves(board):
+    # Board memoizes the legal moves of the position, generate them again
+    board._legal_cache = {}
+    board.legal_moves()
+
+
+def _heuristic(heuristics):
+    # The mobility term reads the memoized legal moves, generate them again
+    heuristics._board._legal_cache = {}
+    heuristics.total_heuristic()
+
+
+def _push_pop(board):
+    board.push(board.legal_moves()[0])
+    board.pop()
+
+
+def bench_board(boards, duration):
+    legal_moves = _rate(_legal_moves, boards, duration)
+    push_pop = _rate(_push_pop, boards, duration)
+    return {"legal_moves": (legal_moves, "calls/s"), "push_pop": (push_pop, "pairs/s")}
+
+
+def bench_heuristics(boards, duration):
+    results = {}
+    for heuristics_class in (Heuristics, BitboardHeuristics):
+        heuristics = [heuristics_class(board, board.get_next_player(),
+                                       Reversi.Board._BLACK + Reversi.Board._WHITE - board.get_next_player())
+                      for board in boards]
+        rate = _rate(_heuristic, heuristics, duration)
+        results[heuristics_class.__name__] = (rate, "evals/s")
+    return results
+
+
+def bench_alphabeta(boards, duration, bitboard=False):
+    "Iterative deepening of AlphaBetaPlayer for duration / len(boards) s on each board"
+    nodes, elapsed, depths = 0, 0., []
+    for board in boards:
+        player = AlphaBetaPlayer(board.get_next_player(), 8, bitboard=bitboard, endgame_empties=0)
+        player._set_position(deepcopy(board), board.get_next_player())
+        player.timer = FixedTimer(duration / len(boards))
+        player.timer.start_turn()
+        start = time.perf_counter()
+        player.iterative_deepening(player._get_search_callback(), 0)
+        elapsed += time.perf_counter() - start
+        nodes += player.nodes
+        depths.append(player.depth)
+    return {"nodes": (nodes / elapsed, "nodes/s"),
+            "depth": (sum(depths) / len(depths), "plies")}
+
+
+def bench_mcts(boards, duration, n_rollouts=1):
+    "Iterations of a new MCTS for duration / len(boards) s on each board"
+    iterations, elapsed = 0, 0.
+    for board in boards:
+        mcts = MCTS(n_rollouts, seed=0)
+        root = mcts.get_tree().root
+        start = time.perf_counter()
+        deadline = start + duration / len(boards)
+        while time.perf_counter() < deadline:
+            mcts.mcts_one_iteraction(board, root)
+            iterations += 1
+        elapsed += time.perf_counter() - start
+    return {"iterations": (iterations / elapsed, "iterations/s"),
+            "rollouts": (iterations * n_rollouts / elapsed, "rollouts/s")}
+
+
+def run(duration=1., bitboard=False, search_duration=None):
+    """
+    Run the benchmarks, each one for duration s per phase (search_duration
+    for the searches, 2*duration by default). Return the results dict.
+    """
+    search_duration = 2 * duration if search_duration is None else search_duration
+    positions = load_positions(bitboard=bitboard)
+    results = {}
+
+    def add(prefix, phase, values):
+        for name, (value, unit) in values.items():
+            results[f"{prefix}.{name}/{phase}"] = {"value": value, "unit": unit}
+
+    for phase in PHASES:
+        boards = [board for _name, board_phase, board in positions if board_phase == phase]
+        with quiet():
+            add("board", phase, bench_board(boards, duration))
+            add("heuristics", phase, bench_heuristics(boards, duration))
+            add("alphabeta", phase, bench_alphabeta(boards, search_duration, bitboard))
+            add("mcts", phase, bench_mcts(boards, search_duration))
+            add("mcts_batch", phase, bench_mcts(boards, search_duration, n_rollouts=32))
+        logger.info("%s positions done", phase)
+    return {"meta": {"python": platform.python_version(), "platform": platform.platform(),
+                     "bitboard": bitboard, "duration": duration,
+                     "search_duration": search_duration, "time": time.time()},
+            "results": results}
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Regressions of results against baseline: list of (name, value, baseline
+    value) of the values more than tolerance (a fraction) below the baseline.
+    """
+    regressions = []
+    for name, entry in baseline["results"].items():
+        if name not in results["results"]:
+            continue
+        value = results["results"][name]["value"]
+        if value < entry["value"] * (1 - tolerance):
+            regressions.append((name, value, entry["value"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--duration", type=float, default=1.,
+                        help="seconds of each benchmark per phase (default 1)")
+    parser.add_argument("--bitboard", action="store_true", help="use the bitboard backend")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare to the results of this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="slowdown fraction accepted against the baseline (default 0.2)")
+    parser.add_argument("--save-baseline", help="write the results as the baseline to this JSON file")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    results = run(args.duration, args.bitboard)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as file:
+                json.dump(results, file, indent=2)
+    if not args.output:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.tolerance)
+        for name, value, base in regressions:
+            logger.error("REGRESSION %s: %.4g, baseline %.4g (%+.1f%%)",
+                         name, value, base, 100 * (value / base - 1))
+        if regressions:
+            return 1
+        logger.info("No regression against %s", args.baseline)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,28 +1,44 @@
-import sys
 import time
-import Reversi
+import contextlib
+import logging
 import joblib
-import os
 import random
 from copy import deepcopy
 from io import StringIO
 from players.RandomPlayer import RandomPlayer
 from players.AlphaBetaPlayer import AlphaBetaPlayer
-from players.MCTSPlayer import MCTSPlayer, MCTS
+from players.MCTSPlayer import MCTS
+from players.OpeningBook import OpeningBook
+from Training import Trainer
 
+logger = logging.getLogger(__name__)
 
-def simulate_multiple_games(player1, player2, board, n_games):
 
+@contextlib.contextmanager
+def quiet(level=logging.INFO):
+    "Block in which log messages of level and below are dropped before being formatted"
+    previous = logging.root.manager.disable
+    logging.disable(level)
+    try:
+        yield
+    finally:
+        logging.disable(previous)
+
+
+def simulate_multiple_games(player1, player2, board, n_games, seed=None):
+    "Play n_games games, the colors being drawn by a generator seeded by seed"
+    rng = random.Random(seed)
     winners = []
     for g in range(1, 1+n_games):
         # Assign random color to each player
-        player1.newGame(random.choice([board._WHITE, board._BLACK]))
+        player1.newGame(rng.choice([board._WHITE, board._BLACK]))
         player2.newGame(board._flip(player1.color))
 
-        sys.stdout = open(os.devnull, 'w')
         b = deepcopy(board)
-        winner = play(player1, player2, b)
-        sys.stdout = sys.__stdout__
+        with quiet():
+            winner = play(player1, player2, b)
+            player1.endGame(winner)
+            player2.endGame(winner)
         if winner == player1.color:
             winner_str = player1.getPlayerName()
         elif winner == player2.color:
@@ -33,14 +49,22 @@ def simulate_multiple_games(player1, player2, board, n_games):
         winners.append(winner_str)
 
         if g % 1 == 0:
-            print("End of game", g, "winner:", winner_str)
-
-    print("End of", n_games, "simulations\n", "-"*50)
-    print("Player1:", player1.getPlayerName(), "wins:", winners.count(player1.getPlayerName()), ", Player2", player2.getPlayerName(), "wins:",
-          winners.count(player2.getPlayerName()), ", Ties:", winners.count("tie"))
-
-
-def play(player1, player2, b):
+            logger.info("End of game %d winner: %s", g, winner_str)
+
+    logger.info("End of %d simulations\n%s", n_games, "-"*50)
+    logger.info("Player1: %s wins: %d, Player2 %s wins: %d, Ties: %d", player1.getPlayerName(),
+                winners.count(player1.getPlayerName()), player2.getPlayerName(),
+                winners.count(player2.getPlayerName()), winners.count("tie"))
+
+
+def play(player1, player2, b, on_move=None):
+    """
+    Referee a game between player1 and player2 on board b, return the winner color.
+    on_move, if given, is called after each move with a dict describing it:
+    move number, color and name of the player, x, y, time taken and discs counts.
+    Both players run in this process: a pondering player (ponder=True) shares
+    the interpreter with its opponent, its pondering taking the opponent's time.
+    """
     # Black begins
     next_player, other_player = (
         player1, player2) if player1.color == b._BLACK else (player2, player1)
@@ -49,70 +73,96 @@ def play(player1, player2, b):
     # total real time for each player
     totalTime = {p.getPlayerName(): 0 for p in [next_player, other_player]}
 
-    print(b.legal_moves())
     while not b.is_game_over():
-        print("Referee Board:")
-        print(b)
-        print("Before move", nbmoves)
-        print("Legal Moves: ", b.legal_moves())
-
-        nbmoves += 1
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Referee Board:\n%s", b)
+            logger.debug("Before move %d", nbmoves)
+            logger.debug("Legal Moves: %s", b.legal_moves())
 
         currentTime = time.time()
         move = next_player.getPlayerMove()
-        totalTime[next_player.getPlayerName()] += time.time() - currentTime
-        print(next_player.color,
-              next_player.getPlayerName(), "plays" + str(move))
+        move_time = time.time() - currentTime
+        totalTime[next_player.getPlayerName()] += move_time
+        logger.info("%s %s plays %s", next_player.color,
+                    next_player.getPlayerName(), move)
         (x, y) = move
         if not b.is_valid_move(next_player.color, x, y):
-            print(other_player, next_player, next_player.color)
-            print("Problem: illegal move")
+            logger.error("Problem: illegal move of %s (%s)",
+                         next_player.getPlayerName(), next_player.color)
             break
         b.push([next_player.color, x, y])
         other_player.playOpponentMove(x, y)
+        if on_move is not None:
+            (nbwhites, nbblacks) = b.get_nb_coins()
+            on_move({"move": nbmoves, "color": next_player.color,
+                     "player": next_player.getPlayerName(), "x": x, "y": y,
+                     "time": move_time, "nb_white": nbwhites, "nb_black": nbblacks})
+        nbmoves += 1
 
         # Invert players
         next_player, other_player = other_player, next_player
 
-    print(b)
-    print("The game is over")
     (nbwhites, nbblacks) = b.get_nb_coins()
     winner = b.get_winner()
-    print("Time:", totalTime)
-    print("Winner: ", end="")
-    if winner == b._WHITE:
-        print("WHITE")
-    elif winner == b._BLACK:
-        print("BLACK")
-    else:
-        print("DEUCE")
-    print("Final is: ", nbwhites, "whites and ", nbblacks, "blacks")
+    if logger.isEnabledFor(logging.INFO):
+        logger.debug("%s", b)
+        logger.info("The game is over")
+        logger.info("Time: %s", totalTime)
+        logger.info("Winner: %s", "WHITE" if winner == b._WHITE else
+                    "BLACK" if winner == b._BLACK else "DEUCE")
+        logger.info("Final is: %d whites and %d blacks", nbwhites, nbblacks)
     return winner
 
 
-def load_mcts(path):
+def load_mcts(path, mmap_mode="r"):
+    "Load an MCTS saved by MCTS.save (memory-mapped, see MCTS.load) or an older joblib pickle"
+    if MCTS.is_mcts_file(path):
+        return MCTS.load(path, mmap_mode)
     return joblib.load(path)
 
 
-def train(n_iter=100, b_size=8):
-    b = Reversi.Board(board_size=b_size)
-    mcts = MCTS()
-    mcts.train(b, n_iter)
-    mcts.save(f"mcts_save/mcts_{n_iter}_iter_size_{b_size}.pickle")
+def train(n_iter=100, b_size=8, bitboard=False, n_workers=1, checkpoint_dir="mcts_save/checkpoints"):
+    "Train an MCTS for n_iter iterations by self-play, resuming from the last checkpoint of checkpoint_dir"
+    trainer = Trainer(checkpoint_dir, b_size, bitboard, n_workers)
+    trainer.run(n_iter)
+    trainer.mcts.save(f"mcts_save/mcts_{n_iter}_iter_size_{b_size}.mcts")
+
+
+def build_book(mcts_path, path="book.npz", b_size=8, ab_plies=4, ab_time=5):
+    "Opening book from the MCTS saved in mcts_path and AlphaBeta searches of ab_time s up to ab_plies moves"
+    book = OpeningBook(b_size)
+    book.add_mcts(load_mcts(mcts_path))
+    book.add_alphabeta(max_plies=ab_plies, time_per_position=ab_time)
+    book.save(path)
+    return book
 
 
 if __name__ == "__main__":
+    # logging.DEBUG also shows the boards, logging.WARNING only the problems
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
     # #Train mcts for n iterations
     # n = 10
     # train(10, b_size=8) #uncomment to retrain the mcts
 
-    # #Test mcts vs alphabeta for 120 games
-    board = Reversi.Board(8)
-    mcts = load_mcts("mcts_save/mcts_10000_iter_size_8.pickle")
-    p1, p2 = MCTSPlayer(
-        0, mcts, board._boardsize, max_time=120), AlphaBetaPlayer(1, board._boardsize, max_time=120)
-
-    simulate_multiple_games(p1, p2, board, n_games=30)
+    # #Test mcts vs alphabeta for 30 games, played in parallel on all cores
+    # bitboard=True uses the bitboard backend for the referee and players
+    from Tournament import Tournament, PlayerSpec, mcts_player
+    bitboard = False
+    p1 = PlayerSpec(mcts_player, "MCTS", mcts_path="mcts_save/mcts_10000_iter_size_8.pickle",
+                    board_size=8, max_time=120, bitboard=bitboard)
+    p2 = PlayerSpec(AlphaBetaPlayer, "AlphaBeta", board_size=8, max_time=120, bitboard=bitboard)
+    Tournament(p1, p2, board_size=8, bitboard=bitboard).run(n_games=30)
+
+    # # Same games one after another in this process
+    # import Reversi
+    # from players.MCTSPlayer import MCTSPlayer
+    # board = Reversi.Board(8, bitboard=bitboard)
+    # mcts = load_mcts("mcts_save/mcts_10000_iter_size_8.pickle")
+    # p1, p2 = MCTSPlayer(
+    #     0, mcts, board._boardsize, max_time=120, bitboard=bitboard), AlphaBetaPlayer(1, board._boardsize, max_time=120, bitboard=bitboard)
+    # simulate_multiple_games(p1, p2, board, n_games=30)
+    # p1.close(), p2.close()
 
     # # Show graph for 5 iterations
     # mcts = load_mcts("mcts_save/mcts_5_iter_size_8.pickle")
@@ -1,19 +1,101 @@
 # -*- coding: utf-8 -*-
 
 import time
+import logging
+import math
 import Reversi
-from players.Heuristics import Heuristics
-from random import randint
+from players.Heuristics import BitboardHeuristics
 from players.playerInterface import *
-from players.Timer import Timer
+from players.Timer import Timer, WorkTimer
+from players.TranspositionTable import TranspositionTable, SharedTranspositionTable
+from players.MoveOrdering import MoveOrdering
+from players.EndgameSolver import EndgameSolver
+from players.Pondering import Ponderer
+from players import Symmetry
+from players.SearchStats import AlphaBetaStats, write_jsonl
 from copy import deepcopy
 
+logger = logging.getLogger(__name__)
+
 
 class AlphaBetaPlayer(PlayerInterface):
+    """
+    Reversi player based on negAlphaBeta with iterative deepening.
+
+    Search modes (search argument):
+        "legacy": historical search, starting from a (-1e-8, 1e-8) window
+        "alphabeta": alpha-beta starting from a full window
+        "pvs": principal variation search (null window searches after the first move,
+            re-searched when they fail high), with aspiration windows of half width
+            aspiration_window centred on the previous iteration score
+    When endgame_empties squares or less are empty, the position is solved
+    exactly by EndgameSolver instead (0 disables the solver).
+    With n_workers > 1, n_workers-1 helper processes search the same position
+    in parallel and share the transposition table, see LazySMP.
+    With ponder, the player keeps searching the opponent's position in the
+    background during the opponent's turn, filling the transposition table.
+    Pondering runs in a thread: it only gains time when the opponent runs in
+    another process, as the referee and the players of main.play and
+    Tournament share one process, where it takes its time from the opponent.
+    Positions of book (an OpeningBook) are played without searching.
+    Positions with at most symmetric_tt_discs discs are stored in the
+    transposition table under their canonical key (see Symmetry), so that
+    symmetric positions share their entry, the moves being stored in canonical
+    coordinates. Canonical keys are slower to compute than the Zobrist hash
+    and symmetric positions are rare after the opening (0 disables them).
+    The statistics of the search of each move (AlphaBetaStats) are kept in
+    game_stats, and appended to the JSON lines file stats_path at the end of
+    each game if it is given.
+    With budget, each move gets budget units of work (see WorkTimer) instead
+    of the time limit, so that games are reproducible: as the work of
+    pondering and helpers depends on time, budget requires n_workers=1 and
+    ponder=False. A unit is a time check: one per
+    child searched (two for PVS re-searches) and one per iteration, so a
+    unit is close to, but not exactly, a node.
+    """
+    SEARCH_MODES = ("legacy", "alphabeta", "pvs")
+    # Score of a won game, above any heuristic value
+    _WIN_SCORE = 1e6
+    # Width of the null windows used by pvs (heuristic values are floats)
+    _NULL_WINDOW = 1e-6
 
-    def __init__(self, color, board_size=8, max_time=120):
-        self._board = Reversi.Board(board_size)
+    def __init__(self, color, board_size=8, max_time=120, bitboard=False, tt_size=2**18,
+                 move_ordering=None, search="alphabeta", aspiration_window=5000, endgame_empties=10,
+                 n_workers=1, ponder=False, book=None, symmetric_tt_discs=0, stats_path=None,
+                 budget=None):
+        if budget is not None and (n_workers > 1 or ponder):
+            raise ValueError("budget makes the search reproducible, it requires n_workers=1 and ponder=False")
+        if search not in self.SEARCH_MODES:
+            raise ValueError(
+                f"Unknown search mode {search}, expected one of {self.SEARCH_MODES}")
+        self.search = search
+        self.aspiration_window = aspiration_window
+        self._bitboard = bitboard
+        self._board = Reversi.Board(board_size, bitboard=bitboard)
         self.max_time = max_time
+        self.budget = budget
+        # tt_size=0 disables the transposition table
+        if tt_size > 0:
+            self.tt = SharedTranspositionTable(tt_size) if n_workers > 1 else TranspositionTable(tt_size)
+        else:
+            self.tt = None
+        # Any object with new_search, order, cutoff and report methods,
+        # MoveOrdering(sources=()) keeps the legal moves order
+        self.move_ordering = MoveOrdering(
+            board_size) if move_ordering is None else move_ordering
+        self.endgame_empties = endgame_empties
+        self.symmetric_tt_discs = symmetric_tt_discs
+        self.endgame_solver = EndgameSolver(board_size)
+        self._smp = None
+        if n_workers > 1:
+            from players.LazySMP import LazySMP
+            self._smp = LazySMP(self, n_workers - 1)
+        self.ponder = ponder
+        self.book = book
+        self.stats_path = stats_path
+        self._ponderer = Ponderer()
+        # should_stop of the background search while pondering, None otherwise
+        self._ponder_should_stop = None
         self.newGame(color)
 
     def getPlayerName(self):
@@ -21,42 +103,139 @@ class AlphaBetaPlayer(PlayerInterface):
 
     def getPlayerMove(self):
         if self._board.is_game_over():
-            print("Referee told me to play but the game is over!")
+            logger.warning("Referee told me to play but the game is over!")
             return (-1, -1)
+        self._ponderer.stop()
         self.timer.start_turn()
         move = self.get_move()
         self._board.push(move)
         self.timer.stop_turn()
-        print("I am playing ", move)
+        self.game_stats.append(self._stats)
+        logger.debug("I am playing %s", move)
         (c, x, y) = move
         assert(c == self.color)
-        print("My current board :")
-        print(self._board)
+        logger.debug("My current board :\n%s", self._board)
+        if self.ponder and not self._board.is_game_over():
+            # The pondering statistics are dropped
+            self._stats = AlphaBetaStats()
+            self._ponderer.start(self._ponder)
         return (x, y)
 
     def get_move(self):
-        move = self.iterative_deepening(self.negAlphaBeta, 2)
+        "Best move of the position, the statistics of its search being left in _stats"
+        stats = self._stats = AlphaBetaStats()
+        start, nodes = time.time(), self.nodes
+        move = self._search_move()
+        stats.time = time.time() - start
+        stats.nodes += self.nodes - nodes
+        stats.move = list(move)
         return move
 
+    def _search_move(self):
+        if self.book is not None:
+            move = self.book.probe(self._board)
+            if move is not None:
+                logger.info("Book move %s", move)
+                return move
+        empties = self._board.get_board_size()**2 - self._board.get_total_coins()
+        if empties <= self.endgame_empties:
+            move = self.solve_endgame()
+            if move is not None:
+                return move
+        if self.tt is not None:
+            self.tt.new_search()
+        self.move_ordering.new_search()
+        if self._smp is not None:
+            self._smp.start(self._board)
+        move = self.iterative_deepening(self._get_search_callback(), 2)
+        if self._smp is not None:
+            move = self._smp.stop(self.depth, move)
+        return move
+
+    def _get_search_callback(self):
+        "Search function called by iterative_deepening for each depth"
+        if self.search == "pvs" and self.aspiration_window:
+            return self.aspiration_search
+        return self.negAlphaBeta
+
+    def solve_endgame(self):
+        "Best move found by the exact endgame solver, None if it ran out of time"
+        # Keep half of the time of the turn for the usual search if the solver fails
+        start = time.time()
+        score, move = self.endgame_solver.solve(
+            self._board, should_stop=self.timer.should_stop_after(0.5))
+        logger.info("Endgame solver took %.3f s, %d nodes, score %s",
+                    time.time()-start, self.endgame_solver.nodes, score)
+        self._stats.nodes += self.endgame_solver.nodes
+        return move
+
+    def _ponder(self, should_stop):
+        "Search the position of the opponent, deeper and deeper, until should_stop()"
+        self._ponder_should_stop = should_stop
+        nodes = self.nodes
+        empties = self._board.get_board_size()**2 - self._board.get_total_coins()
+        horizon = 1
+        try:
+            while horizon <= empties and not should_stop():
+                self.negAlphaBeta(is_white=not self._is_white, horizon=horizon)
+                horizon += 1
+        finally:
+            self._ponder_should_stop = None
+        logger.info("Pondered %d nodes, up to depth %d", self.nodes - nodes, horizon - 1)
+
+    def _should_stop(self):
+        "True when the running search must stop: out of time for the turn, or end of pondering"
+        if self._ponder_should_stop is not None:
+            return self._ponder_should_stop()
+        return self.timer.out_of_time_for_turn()
+
     def playOpponentMove(self, x, y):
+        self._ponderer.stop()
         assert(self._board.is_valid_move(self._opponent, x, y))
-        print("Opponent played ", (x, y))
+        logger.debug("Opponent played %s", (x, y))
         self._board.push([self._opponent, x, y])
 
     def newGame(self, color):
-        self._board = Reversi.Board(self._board.get_board_size())
+        self._ponderer.stop()
+        self._set_position(Reversi.Board(
+            self._board.get_board_size(), bitboard=self._bitboard), color)
+        if self.budget is not None:
+            self.timer = WorkTimer(self.budget)
+        else:
+            self.timer = Timer(max_time=self.max_time, max_n_turns=4 +
+                               (self._board.get_board_size()**2)/2)
+        # Stored values depend on our color
+        if self.tt is not None:
+            self.tt.clear()
+        self.nodes = 0
+        self._stats = AlphaBetaStats()
+        self.game_stats = []
+        self._game_start = time.time()
+
+    def _set_position(self, board, color):
+        "Search board as color from now on"
+        self._board = board
         self.color = color
         self._opponent = self._board._BLACK if color == self._board._WHITE else self._board._WHITE
         self._is_white = (self.color == self._board._WHITE)
-        self.heuristics = Heuristics(self._board, self.color, self._opponent)
-        self.timer = Timer(max_time=self.max_time, max_n_turns=4 +
-                           (self._board.get_board_size()**2)/2)
+        self.heuristics = BitboardHeuristics(self._board, self.color, self._opponent)
 
     def endGame(self, winner):
+        self._ponderer.stop()
+        if self.stats_path is not None:
+            write_jsonl(self.stats_path, self.game_stats, player=self.getPlayerName(),
+                        color=self.color, winner=winner, game_start=self._game_start)
         if self.color == winner:
-            print("I won!!!")
+            logger.info("I won!!!")
         else:
-            print("I lost :(!!")
+            logger.info("I lost :(!!")
+
+    def close(self):
+        "Stop pondering and the LazySMP helpers"
+        self._ponderer.stop()
+        if self._smp is not None:
+            self._smp.close()
+            self._smp = None
 
     def naive_heuristic(self):
         return self._board.heuristic()
@@ -65,37 +244,101 @@ class AlphaBetaPlayer(PlayerInterface):
         return self.heuristics.total_heuristic()
 
     def estimate_end(self, is_white):
+        "Value of the position for the player to play (white if is_white)"
         if self._board.is_game_over():
             (nb_white, nb_black) = self._board.get_nb_coins()
             if nb_white == nb_black:
                 val = 0
             elif nb_white > nb_black:
-                val = 1000 if is_white else -1000
+                val = self._WIN_SCORE if is_white else -self._WIN_SCORE
             else:
-                val = -1000 if is_white else 1000
+                val = -self._WIN_SCORE if is_white else self._WIN_SCORE
         else:
+            # The heuristic is computed for our color
+            start = time.perf_counter()
             val = self.heuristic()
+            self._stats.heuristic_time += time.perf_counter() - start
+            self._stats.leaf_evaluations += 1
+            if is_white != self._is_white:
+                val = -val
         return (val, None)
 
+    def _tt_key(self, board):
+        "Transposition table key of board and the symmetry mapping board to the position of the key"
+        if board.get_total_coins() <= self.symmetric_tt_discs:
+            key, t = Symmetry.canonical_key(board)
+            return hash(key) & 0xFFFFFFFFFFFFFFFF, t
+        return board.get_hash(), Symmetry.IDENTITY
+
+    def _tt_store(self, key, t, horizon, value, bound, move):
+        if move is not None and t != Symmetry.IDENTITY:
+            move = Symmetry.transform_move(t, move, self._board.get_board_size())
+        self.tt.store(key, horizon, value, bound, move)
+
     # Neg Alpha Beta avec version d'echec
-    def negAlphaBeta(self, alpha=None, beta=None, is_white=None, horizon=10):
+    def negAlphaBeta(self, alpha=None, beta=None, is_white=None, horizon=10, ply=0):
         # Initialisation
         is_white = self._is_white if is_white is None else is_white
-        alpha = -1e-8 if alpha is None else alpha
-        beta = +1e-8 if beta is None else beta
+        if self.search == "legacy":
+            alpha = -1e-8 if alpha is None else alpha
+            beta = +1e-8 if beta is None else beta
+        else:
+            alpha = -math.inf if alpha is None else alpha
+            beta = math.inf if beta is None else beta
 
         board = self._board
+        self.nodes += 1
+
+        # Transposition table lookup
+        tt_move = None
+        if self.tt is not None:
+            key, t = self._tt_key(board)
+            alpha_orig = alpha
+            entry = self.tt.probe(key)
+            if entry is not None:
+                self._stats.tt_hits += 1
+                _, depth, value, bound, tt_move, _ = entry
+                if tt_move is not None and t != Symmetry.IDENTITY:
+                    tt_move = Symmetry.transform_move(Symmetry.inverse(t), tt_move,
+                                                      board.get_board_size())
+                if depth >= horizon:
+                    if bound == TranspositionTable.EXACT:
+                        return (value, tt_move)
+                    elif bound == TranspositionTable.LOWER:
+                        alpha = max(alpha, value)
+                    else:
+                        beta = min(beta, value)
+                    if alpha >= beta:
+                        return (value, tt_move)
 
         if horizon == 0 or board.is_game_over():
-            return self.estimate_end(is_white)
+            result = self.estimate_end(is_white)
+            if self.tt is not None:
+                self._tt_store(key, t, horizon, result[0],
+                               TranspositionTable.EXACT, None)
+            return result
+
+        start = time.perf_counter()
+        moves = board.legal_moves()
+        self._stats.movegen_time += time.perf_counter() - start
+        moves = self.move_ordering.order(moves, ply, tt_move)
 
         best, best_action = None, None
-        for m in board.legal_moves():
+        for i, m in enumerate(moves):
             board.push(m)
-            (nm, _) = self.negAlphaBeta(-beta, -alpha,
-                                        not is_white, horizon - 1)
+            if self.search == "pvs" and i > 0:
+                # Prove that m is not better than alpha with a null window,
+                # search it again with the full window if it is
+                (nm, _) = self.negAlphaBeta(-alpha - self._NULL_WINDOW, -alpha,
+                                            not is_white, horizon - 1, ply + 1)
+                if nm is not None and alpha < -nm < beta and not self._should_stop():
+                    (nm, _) = self.negAlphaBeta(-beta, -alpha,
+                                                not is_white, horizon - 1, ply + 1)
+            else:
+                (nm, _) = self.negAlphaBeta(-beta, -alpha,
+                                            not is_white, horizon - 1, ply + 1)
             # Timed out
-            if self.timer.out_of_time_for_turn():
+            if self._should_stop():
                 self._board.pop()
                 return None, None
 
@@ -104,22 +347,82 @@ class AlphaBetaPlayer(PlayerInterface):
                 best, best_action = nm, m
                 if best > alpha:
                     alpha = best
-                    if alpha > beta:  # pruning
+                    if alpha >= beta:  # pruning
                         board.pop()
+                        self._stats.cutoffs += 1
+                        self.move_ordering.cutoff(
+                            m, ply, horizon, i, tt_move)
+                        if self.tt is not None:
+                            self._tt_store(key, t, horizon, best,
+                                           TranspositionTable.LOWER, best_action)
                         return (best, best_action)
             board.pop()
 
+        if self.tt is not None:
+            if best <= alpha_orig:
+                bound = TranspositionTable.UPPER
+            elif best >= beta:
+                bound = TranspositionTable.LOWER
+            else:
+                bound = TranspositionTable.EXACT
+            self._tt_store(key, t, horizon, best, bound, best_action)
         return (best, best_action)
 
-    def iterative_deepening(self, callback, max_time):
-        horizon = 1
+    def aspiration_search(self, horizon=10):
+        "negAlphaBeta in a window centred on the previous iteration score, widened while the search fails"
+        if self._last_score is None:
+            return self.negAlphaBeta(horizon=horizon)
+        delta = self.aspiration_window
+        alpha, beta = self._last_score - delta, self._last_score + delta
+        while True:
+            value, move = self.negAlphaBeta(alpha, beta, horizon=horizon)
+            if value is None or alpha < value < beta:
+                return value, move
+            delta *= 4
+            if delta > self._WIN_SCORE:
+                alpha, beta = -math.inf, math.inf
+            elif value <= alpha:
+                alpha = value - delta
+            else:
+                beta = value + delta
+
+    def iterative_deepening(self, callback, max_time, start_depth=1):
+        horizon = start_depth
         start = time.time()
-        while not self.timer.out_of_time_for_turn():
-            _, result = callback(horizon=horizon)
+        nodes = self.nodes
+        # Nodes searched by each iteration
+        self.iteration_nodes = []
+        # Score and depth of the last completed iteration
+        self._last_score = None
+        self.depth = 0
+        # In case not even the first iteration completes
+        bestmove = self._board.legal_moves()[0]
+        # Deeper searches than the number of empty squares find nothing new
+        empties = self._board.get_board_size()**2 - self._board.get_total_coins()
+        while horizon <= empties and not self.timer.out_of_time_for_turn():
+            iteration_start = self.nodes
+            score, result = callback(horizon=horizon)
             horizon += 1
             # store result if not timed out
             if result is not None:
                 bestmove = result
-        print("Took", time.time()-start, "s")
+                self._last_score = score
+                self.depth = horizon - 1
+                self.iteration_nodes.append(self.nodes - iteration_start)
+        elapsed = time.time() - start
+        self._stats.depth = self.depth
+        logger.info("Took %.3f s, %d nodes, %d nodes/s, depth %d", elapsed, self.nodes - nodes,
+                    (self.nodes - nodes) / max(elapsed, 1e-9), self.depth)
+        if logger.isEnabledFor(logging.INFO):
+            report = self.move_ordering.report()
+            logger.info("Cutoffs: %d in %d nodes, first move cutoffs: %.1f %%, effective branching factor: %.2f",
+                        report["cutoffs"], report["nodes"], 100 * report["first_move_cutoff_rate"],
+                        self.effective_branching_factor())
 
         return bestmove
+
+    def effective_branching_factor(self):
+        "Ratio between the nodes of the last two completed iterations of the last search"
+        if len(self.iteration_nodes) < 2 or self.iteration_nodes[-2] == 0:
+            return 0
+        return self.iteration_nodes[-1] / self.iteration_nodes[-2]
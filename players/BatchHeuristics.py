@@ -0,0 +1,157 @@
+"""
+Batched versions of the Heuristics evaluation and of the legal moves generation.
+
+Positions are given either as an (N, size, size) array of squares (Board._EMPTY,
+Board._BLACK, Board._WHITE), or as an (N, 2) uint64 array of (black, white)
+bitboards (see Board.get_bitboards), so boards up to 8x8 are supported.
+Every function works on the N positions at once with NumPy.
+"""
+import numpy as np
+import Reversi
+from Reversi import Board
+
+_MAX_SIZE = 8
+
+# Early, mid and end game weights of (corners, mobility, disc difference,
+# coin parity, stability), as in Heuristics.total_heuristic
+_WEIGHTS = {"early": (1000, 50, 0, 0, 0),
+            "mid": (1000, 20, 10, 100, 500),
+            "end": (1000, 100, 500, 500, 0)}
+
+
+def _popcount(x):
+    "Number of set bits of each element of a uint64 array"
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x).astype(np.int64)
+    bytes_ = x.view(np.uint8).reshape(x.shape + (8,))
+    return np.unpackbits(bytes_, axis=-1).sum(axis=-1, dtype=np.int64)
+
+
+def _get_shifts(size):
+    "Bitboard shifts of Reversi as uint64 NumPy scalars"
+    full, left, right = Reversi._get_bitboard_shifts(size)
+    return (np.uint64(full),
+            [(np.uint64(s), np.uint64(m)) for s, m in left],
+            [(np.uint64(s), np.uint64(m)) for s, m in right])
+
+
+def to_bitboards(positions):
+    "Convert an (N, size, size) array of squares to an (N, 2) uint64 array of (black, white) bitboards"
+    positions = np.asarray(positions)
+    n_positions, size = positions.shape[0], positions.shape[-1]
+    if size > _MAX_SIZE:
+        raise ValueError(f"Boards larger than {_MAX_SIZE}x{_MAX_SIZE} do not fit in 64 bits")
+    flat = positions.reshape(n_positions, size * size)
+    weights = np.uint64(1) << np.arange(size * size, dtype=np.uint64)
+    bitboards = np.empty((n_positions, 2), dtype=np.uint64)
+    bitboards[:, 0] = ((flat == Board._BLACK) * weights).sum(axis=1, dtype=np.uint64)
+    bitboards[:, 1] = ((flat == Board._WHITE) * weights).sum(axis=1, dtype=np.uint64)
+    return bitboards
+
+
+def _as_bitboards(positions, size):
+    positions = np.asarray(positions)
+    if positions.ndim == 3:
+        return to_bitboards(positions)
+    if positions.ndim == 2 and positions.shape[1] == 2:
+        if size > _MAX_SIZE:
+            raise ValueError(f"Boards larger than {_MAX_SIZE}x{_MAX_SIZE} do not fit in 64 bits")
+        return positions.astype(np.uint64, copy=False)
+    raise ValueError(
+        f"Expected an (N, size, size) or (N, 2) array, got shape {positions.shape}")
+
+
+def _own_opp(bitboards, player):
+    "Split bitboards in (player discs, opponent discs), player being a color or an array of colors"
+    is_black = np.broadcast_to(np.asarray(player) == Board._BLACK, bitboards.shape[:1])
+    own = np.where(is_black, bitboards[:, 0], bitboards[:, 1])
+    opp = np.where(is_black, bitboards[:, 1], bitboards[:, 0])
+    return own, opp
+
+
+def _moves(own, opp, size):
+    full, left, right = _get_shifts(size)
+    moves = np.zeros_like(own)
+    for shift, mask in left:
+        reached = (own << shift) & mask & opp
+        for _ in range(size - 3):
+            reached |= (reached << shift) & mask & opp
+        moves |= (reached << shift) & mask
+    for shift, mask in right:
+        reached = (own >> shift) & mask & opp
+        for _ in range(size - 3):
+            reached |= (reached >> shift) & mask & opp
+        moves |= (reached >> shift) & mask
+    return moves & ~(own | opp) & full
+
+
+def legal_moves_masks(positions, player, size=8):
+    """
+    Legal moves of player in each position, as a (N,) uint64 array of masks
+    (bit x*size+y set if player can play in (x, y)).
+    player is a color or an (N,) array of colors.
+    """
+    bitboards = _as_bitboards(positions, size)
+    own, opp = _own_opp(bitboards, player)
+    return _moves(own, opp, size)
+
+
+def masks_to_grids(masks, size=8):
+    "Convert an (N,) uint64 array of masks to an (N, size, size) boolean array"
+    masks = np.asarray(masks, dtype=np.uint64)
+    bits = (masks[:, None] >> np.arange(size * size, dtype=np.uint64)) & np.uint64(1)
+    return bits.astype(bool).reshape(-1, size, size)
+
+
+def _heuristic_value(value_p, value_o):
+    "Heuristics._get_heuristic_value on arrays"
+    total = value_p + value_o
+    return np.where(total == 0, 0., 100 * (value_p - value_o) / np.where(total == 0, 1, total))
+
+
+def total_heuristic(positions, player, size=8):
+    """
+    Heuristics.total_heuristic of each position for player, as a (N,) float array.
+    player is a color or an (N,) array of colors.
+    """
+    bitboards = _as_bitboards(positions, size)
+    own, opp = _own_opp(bitboards, player)
+    full, left, right = _get_shifts(size)
+
+    nb_own, nb_opp = _popcount(own), _popcount(opp)
+    corners = np.uint64((1 << 0) | (1 << (size - 1)) |
+                        (1 << (size * (size - 1))) | (1 << (size * size - 1)))
+    # A pass counts for one move, as in Board.legal_moves
+    mobility_h = _heuristic_value(np.maximum(_popcount(_moves(own, opp, size)), 1),
+                                  np.maximum(_popcount(_moves(opp, own, size)), 1))
+    corners_h = _heuristic_value(_popcount(own & corners), _popcount(opp & corners))
+    disc_difference_h = nb_own - nb_opp
+    coin_parity_h = _heuristic_value(nb_own, nb_opp)
+
+    # (disc, empty neighbor) pairs, as in Heuristics._get_stability
+    empty = full & ~(own | opp)
+    stability_p = np.zeros_like(nb_own)
+    stability_o = np.zeros_like(nb_opp)
+    for shift, mask in left:
+        neighbors = (empty << shift) & mask
+        stability_p += _popcount(neighbors & own)
+        stability_o += _popcount(neighbors & opp)
+    for shift, mask in right:
+        neighbors = (empty >> shift) & mask
+        stability_p += _popcount(neighbors & own)
+        stability_o += _popcount(neighbors & opp)
+    stability_h = _heuristic_value(stability_p, stability_o)
+
+    def weighted(stage):
+        c, m, d, p, s = _WEIGHTS[stage]
+        # Same order of operations as Heuristics.total_heuristic
+        value = c * corners_h + m * mobility_h
+        if stage == "mid":
+            return value + d * disc_difference_h + p * coin_parity_h + s * stability_h
+        if stage == "end":
+            return value + d * disc_difference_h + p * coin_parity_h
+        return value
+
+    stone_count = nb_own + nb_opp
+    return np.where(stone_count < 20, weighted("early"),
+                    np.where(stone_count <= 58, weighted("mid"), weighted("end")))
@@ -0,0 +1,151 @@
+import Reversi
+
+
+class _Timeout(Exception):
+    pass
+
+
+class EndgameSolver:
+    """
+    Exact solver for the end of the game, working on bitboards.
+
+    Only the empty squares are tried at each node, in parity order (squares of
+    quadrants with an odd number of empties first), and, far enough from the
+    end, in fastest-first order (moves leaving the fewest replies to the
+    opponent first). A win/loss/draw null window search runs first, then the
+    exact disc differential is searched on the side of the known outcome.
+
+    Arguments:
+        board_size: Size of the board
+        fastest_first_empties: Fastest-first ordering is used when at least
+            this number of squares are empty, parity ordering only below
+        check_every: Number of nodes between two calls to should_stop
+    """
+
+    def __init__(self, board_size=8, fastest_first_empties=7, check_every=1024):
+        self.board_size = board_size
+        self.fastest_first_empties = fastest_first_empties
+        self.check_every = check_every
+        half = board_size // 2
+        # Quadrant of each square
+        self._regions = [(x >= half) * 2 + (y >= half)
+                         for x in range(board_size) for y in range(board_size)]
+        self.nodes = 0
+        self._should_stop = None
+
+    def solve(self, board, should_stop=None):
+        """
+        Solve the position for the player to play.
+        Return (disc differential, best move) for this player, or (None, None)
+        if should_stop() became true before the end of the search.
+        """
+        player = board.get_next_player()
+        black, white = board.get_bitboards()
+        own, opp = (black, white) if player == Reversi.Board._BLACK else (white, black)
+        size = self.board_size
+        empties = [i for i in range(size * size) if not ((own | opp) >> i) & 1]
+        self.nodes = 0
+        self._should_stop = should_stop
+        try:
+            # Win/loss/draw first
+            wld, move = self._root(own, opp, empties, -1, 1)
+            if wld > 0:
+                score, move = self._root(own, opp, empties, 0, size * size + 1)
+            elif wld < 0:
+                score, move = self._root(own, opp, empties, -size * size - 1, 0)
+            else:
+                score = 0
+        except _Timeout:
+            return None, None
+        if move is None:
+            return score, [player, -1, -1]
+        return score, [player, move // size, move % size]
+
+    def _root(self, own, opp, empties, alpha, beta):
+        "Search of the root position, also returning the best square (None to pass)"
+        best, best_move = None, None
+        for square, flips in self._ordered_moves(own, opp, empties):
+            bit = 1 << square
+            remaining = [e for e in empties if e != square]
+            value = -self._search(opp ^ flips, own | flips | bit,
+                                  remaining, -beta, -alpha, False)
+            if best is None or value > best:
+                best, best_move = value, square
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        break
+        if best is None:
+            best = -self._search(opp, own, empties, -beta, -alpha, True)
+        return best, best_move
+
+    def _ordered_moves(self, own, opp, empties):
+        "Legal moves (square, flips) among the empty squares, best first"
+        size = self.board_size
+        moves = []
+        for square in empties:
+            flips = Reversi.bitboard_flips(own, opp, 1 << square, size)
+            if flips:
+                moves.append((square, flips))
+        if len(moves) <= 1:
+            return moves
+
+        parity = 0
+        for square in empties:
+            parity ^= 1 << self._regions[square]
+
+        if len(empties) >= self.fastest_first_empties:
+            def key(move):
+                square, flips = move
+                new_opp = opp ^ flips
+                new_own = own | flips | (1 << square)
+                mobility = bin(Reversi.bitboard_moves(
+                    new_opp, new_own, size)).count("1")
+                return (mobility, not (parity >> self._regions[square]) & 1)
+        else:
+            def key(move):
+                return not (parity >> self._regions[move[0]]) & 1
+        moves.sort(key=key)
+        return moves
+
+    def _search(self, own, opp, empties, alpha, beta, passed):
+        "Fail-soft negamax returning the final disc differential for own"
+        self.nodes += 1
+        if self._should_stop is not None and self.nodes % self.check_every == 0 \
+                and self._should_stop():
+            raise _Timeout()
+
+        if len(empties) == 1:
+            return self._last_square(own, opp, empties[0])
+
+        best = None
+        for square, flips in self._ordered_moves(own, opp, empties):
+            bit = 1 << square
+            remaining = [e for e in empties if e != square]
+            value = -self._search(opp ^ flips, own | flips | bit,
+                                  remaining, -beta, -alpha, False)
+            if best is None or value > best:
+                best = value
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        break
+        if best is None:
+            if passed:  # neither player can play
+                return self._final_score(own, opp)
+            return -self._search(opp, own, empties, -beta, -alpha, True)
+        return best
+
+    def _last_square(self, own, opp, square):
+        "Score when a single square is left: own plays it, or opp does, or nobody"
+        bit = 1 << square
+        flips = Reversi.bitboard_flips(own, opp, bit, self.board_size)
+        if flips:
+            return self._final_score(own | flips | bit, opp ^ flips)
+        flips = Reversi.bitboard_flips(opp, own, bit, self.board_size)
+        if flips:
+            return self._final_score(own ^ flips, opp | flips | bit)
+        return self._final_score(own, opp)
+
+    def _final_score(self, own, opp):
+        return bin(own).count("1") - bin(opp).count("1")
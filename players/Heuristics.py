@@ -1,3 +1,4 @@
+import Reversi
 from Reversi import Board
 
 
@@ -13,7 +14,12 @@ class Heuristics:
         self.nb_coins_o = None
 
     def _get_nb_legal_moves(self):
-        return len(self._board.legal_moves("default")), len(self._board.legal_moves("other"))
+        "Number of legal moves (a pass counting for one) for player and opponent"
+        nb_next, nb_other = len(self._board.legal_moves(
+            "default")), len(self._board.legal_moves("other"))
+        if self._board.get_next_player() == self.player:
+            return nb_next, nb_other
+        return nb_other, nb_next
 
     def _set_nb_coins(self):
         self.nb_coins_p = self._board.get_nb_coins(self.player)
@@ -99,3 +105,62 @@ class Heuristics:
         # End game
         else:
             return 1000*self.corners_heuristic() + 100*self.mobility_heuristic() + 500*self.disc_difference_heuristic() + 500*self.coin_parity_heuristic()
+
+
+class BitboardHeuristics(Heuristics):
+    """
+    Same values as Heuristics, computed on the bit planes of the board
+    (see Board.get_bitboards) with shifts and masks instead of walking the grid.
+    """
+
+    def __init__(self, board, player, opponent):
+        super().__init__(board, player, opponent)
+        size = board.get_board_size()
+        self._corners_bits = [(x, y, 1 << (x * size + y))
+                              for x, y in [(0, 0), (0, size-1), (size-1, 0), (size-1, size-1)]]
+        self._own, self._opp = 0, 0
+
+    def _set_bitboards(self):
+        black, white = self._board.get_bitboards()
+        if self.player == Board._BLACK:
+            self._own, self._opp = black, white
+        else:
+            self._own, self._opp = white, black
+
+    def _get_nb_legal_moves(self):
+        size = self._board.get_board_size()
+        # A pass counts for one move, as in Board.legal_moves
+        nb_moves_p = bin(Reversi.bitboard_moves(
+            self._own, self._opp, size)).count("1")
+        nb_moves_o = bin(Reversi.bitboard_moves(
+            self._opp, self._own, size)).count("1")
+        return max(nb_moves_p, 1), max(nb_moves_o, 1)
+
+    def _set_corners(self):
+        self.corners_p, self.corners_o = [], []
+        for (x, y, bit) in self._corners_bits:
+            if self._own & bit:
+                self.corners_p.append((x, y))
+            elif self._opp & bit:
+                self.corners_o.append((x, y))
+
+    def _get_stability(self):
+        # Number of (disc, empty neighbor) pairs: shifting the empty squares
+        # in each direction puts them on the discs they are next to
+        full, left, right = Reversi._get_bitboard_shifts(
+            self._board.get_board_size())
+        empty = full & ~(self._own | self._opp)
+        player_stables, other_stables = 0, 0
+        for shift, mask in left:
+            neighbors = (empty << shift) & mask
+            player_stables += bin(neighbors & self._own).count("1")
+            other_stables += bin(neighbors & self._opp).count("1")
+        for shift, mask in right:
+            neighbors = (empty >> shift) & mask
+            player_stables += bin(neighbors & self._own).count("1")
+            other_stables += bin(neighbors & self._opp).count("1")
+        return player_stables, other_stables
+
+    def total_heuristic(self):
+        self._set_bitboards()
+        return super().total_heuristic()
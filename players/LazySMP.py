@@ -0,0 +1,130 @@
+import logging
+import multiprocessing
+import queue
+import time
+from copy import deepcopy
+from Reversi import Board
+from players.AlphaBetaPlayer import AlphaBetaPlayer
+from players.MoveOrdering import MoveOrdering
+
+logger = logging.getLogger(__name__)
+
+# Move ordering sources of the helpers, so that they do not all search the same moves first
+_HELPER_SOURCES = (MoveOrdering.SOURCES, ("tt", "static"),
+                   ("tt", "history", "static"), ("tt", "killers", "static"))
+
+
+class _StopFlag:
+    "Replaces the Timer of the helpers: out of time once the main search is over"
+
+    def __init__(self, flag):
+        self._flag = flag
+
+    def out_of_time_for_turn(self):
+        return self._flag.value != 0
+
+
+def _helper(index, tt, stop, tasks, results, config):
+    "Helper process: search the positions of tasks until stop is set, put the results in results"
+    # The searches of the helpers are not logged
+    logging.disable(logging.INFO)
+    board_size = config["board_size"]
+    player = AlphaBetaPlayer(Board._BLACK, tt_size=0, endgame_empties=0,
+                             move_ordering=MoveOrdering(
+                                 board_size, _HELPER_SOURCES[(index // 2) % len(_HELPER_SOURCES)]),
+                             **config)
+    player.tt = tt
+    player.timer = _StopFlag(stop)
+    # Half of the helpers are one ply ahead of the others
+    start_depth = 2 + index % 2
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        search, board, color = task
+        player._set_position(board, color)
+        player.move_ordering.new_search()
+        player.nodes = 0
+        move = player.iterative_deepening(player._get_search_callback(), 0, start_depth)
+        results.put((search, (index, player.depth, player._last_score,
+                             move if player.depth > 0 else None, player.nodes)))
+
+
+class LazySMP:
+    """
+    Lazy SMP: helper processes search the same position as the player, from
+    staggered depths and with different move orders, until the player's own
+    (Timer-bounded) iterative deepening is over. All of them share the player
+    transposition table (a SharedTranspositionTable), so the player finds the
+    helpers results in it and reaches deeper depths.
+
+    Arguments:
+        player: AlphaBetaPlayer helped
+        n_helpers: Number of helper processes
+        timeout: Seconds to wait for the results of the helpers after the
+            player search (helpers late or dead are left out)
+    """
+
+    def __init__(self, player, n_helpers, timeout=5.):
+        self._player = player
+        self.timeout = timeout
+        # Number of the current search, to tell the late results of the previous ones
+        self._search = 0
+        self._stop = multiprocessing.RawValue("b", 0)
+        self._tasks = [multiprocessing.Queue() for _ in range(n_helpers)]
+        self._results = multiprocessing.Queue()
+        config = {"board_size": player._board.get_board_size(), "bitboard": player._bitboard,
+                  "search": player.search, "aspiration_window": player.aspiration_window,
+                  "symmetric_tt_discs": player.symmetric_tt_discs}
+        self._helpers = [multiprocessing.Process(
+            target=_helper, args=(i, player.tt, self._stop, tasks, self._results, config), daemon=True)
+            for i, tasks in enumerate(self._tasks)]
+        for helper in self._helpers:
+            helper.start()
+        # Results of the helpers for the last search: (index, depth, score, move, nodes)
+        self.reports = []
+
+    def start(self, board):
+        "Start the helpers search of board, for the player color"
+        self._stop.value = 0
+        self._search += 1
+        # The queues pickle in a background thread, while the player search modifies board
+        board = deepcopy(board)
+        for tasks in self._tasks:
+            tasks.put((self._search, board, self._player.color))
+
+    def stop(self, depth, move):
+        """
+        Stop the helpers, depth and move being the result of the player search.
+        Return the move of the deepest completed search (the player's one if tied).
+        """
+        self._stop.value = 1
+        reports = []
+        deadline = time.time() + self.timeout
+        while len(reports) < len(self._helpers):
+            try:
+                search, report = self._results.get(timeout=max(deadline - time.time(), 0))
+            except queue.Empty:
+                logger.warning("%d helpers did not report within %.1f s",
+                               len(self._helpers) - len(reports), self.timeout)
+                break
+            if search == self._search:
+                reports.append(report)
+        self.reports = sorted(reports)
+        logger.info("Helpers depths: %s, nodes: %d", [report[1] for report in self.reports],
+                    sum(report[4] for report in self.reports))
+        for _index, helper_depth, _score, helper_move, _nodes in self.reports:
+            if helper_move is not None and helper_depth > depth:
+                depth, move = helper_depth, helper_move
+        return move
+
+    def close(self):
+        "Stop the helper processes"
+        self._stop.value = 1
+        for tasks in self._tasks:
+            tasks.put(None)
+        for helper in self._helpers:
+            helper.join(self.timeout)
+            if helper.is_alive():
+                helper.terminate()
+                helper.join()
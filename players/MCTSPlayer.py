@@ -1,166 +1,382 @@
-from operator import itemgetter
+import ast
+import logging
 import random
-import copy
 import numpy as np
 import Reversi
 import matplotlib.pyplot as plt
 import math
+import struct
 import time
 from players.playerInterface import PlayerInterface
-from players.Timer import Timer
+from players.Timer import Timer, WorkTimer
+from players.Rollout import RolloutEngine
+from players.MCTSTree import MCTSTree
+from players.Pondering import Ponderer
+from players import Symmetry
+from players.SearchStats import MCTSStats, write_jsonl
 
-
-def rollout_policy(board):
-    'Rollout randomly'
-    legal_moves = board.legal_moves()
-    action_probs = np.random.rand(len(legal_moves))
-    return zip(legal_moves, action_probs)
+logger = logging.getLogger(__name__)
 
 
 class Node:
-
-    def __init__(self, parent, mcts):
-        self.n_visits = 0
-        self.value = 0
-        self.children = {}
-        self.parent = parent
-        self.mcts = mcts
-
-        if parent == None:
-            self.depth = 0
-        else:
-            self.depth = self.parent.depth + 1
-
-    def add_child(self, action):
-        self.children[str(action)] = Node(parent=self, mcts=self.mcts)
-
-    def is_root(self):
-        return True if self.parent is None else False
-
-    def is_leaf(self):
-        return self.children == {}
-
-    def expand(self, actions):
-        for action in actions:
-            if str(action) not in self.children:
-                self.add_child(action)
-        # Return random child
-        action, random_child = random.choice(list(self.children.items()))
-        return eval(action), random_child
-
-    def select(self):
-        action, node = max(self.children.items(),
-                           key=lambda node: node[1].ucb1())
-        # action is stored as str in dict, we need to convert it in list before passing it to the game
-        action = eval(action)
-        return action, node
-
-    def update(self, value):
-        self.n_visits += 1
-        self.value += value
-
-    def back_propagate(self, value):
-        self.update(value)
-        if not self.is_root():
-            # parent's node refers to opponent's action
-            self.parent.back_propagate(1-value)
-
-    def ucb1(self):
-        return self.value / (self.n_visits+1) + math.sqrt(2 * math.log(self.mcts.get_n_simulations()) / (self.n_visits+1))
-
-    def get_best_action(self):
-        'Get next action based on children values. Return action,node'
-        if self.is_leaf():
-            raise Exception(f"Node {str(self)} do not have any child")
-        # Best action is action with minimal opponnent node value
-        action, node = min(self.children.items(),
-                           key=lambda act_node: act_node[1].value)
-        return eval(action), node
-
-    def find_child_with_action(self, action):
-        action = str(action)
-        # add action if not in child
-        self.expand([action])
-        for child in self.children.items():
-            child_action, child_node = child
-            if child_action == action:
-                return child_node
-        print("NONE", self.children.items())
-        return None
-
-    def __str__(self):
-        return f"Node n°{id(self)} with depth {self.depth} and value {self.value}/{self.n_visits}"
+    "Node of the trees saved before MCTSTree, only kept to load them (see MCTS.__setstate__)"
 
 
 class MCTS:
-    def __init__(self):
-        self._root = Node(parent=None, mcts=self)
+    """
+    Monte Carlo Tree Search. Nodes are indexes in an MCTSTree, the value of a
+    node being the sum of the simulation results for the player to play in it.
+
+    Children are selected with UCB1 (policy="ucb1"):
+        mean + exploration * sqrt(log(parent visits) / visits)
+    or UCB1-Tuned (policy="ucb1-tuned"), which replaces exploration**2 by
+    min(1/4, variance + sqrt(2 * log(parent visits) / visits)), the variance
+    being the one of the child results. mean is the mean result of the child
+    for the player choosing it. Children never visited are selected first.
+
+    Arguments:
+        n_rollouts: Number of random games played from each new node
+        seed: Seed of the random generators (expansions and rollouts)
+        exploration: Exploration constant of UCB1
+        policy: "ucb1" or "ucb1-tuned"
+        board_size: Size of the board searched, saved with the tree
+        symmetric: Create one child per class of symmetric moves: when a
+            symmetry of the board maps a move to another one, both lead to
+            symmetric positions and only the first one gets a child, so that
+            their statistics are shared. Moves must then be mapped to the
+            child reaching a symmetric position, see find_symmetric_child
+
+    The iterations update stats (an MCTSStats), replaced by the caller to
+    measure a search.
+    """
+    POLICIES = ("ucb1", "ucb1-tuned")
+    # Binary format of save: header (magic, version, board size, number of
+    # nodes, root, simulations, rollouts, exploration, policy, flags), then
+    # the node arrays of MCTSTree, see MCTSTree.write_arrays.
+    # Version 1 had no flags.
+    FILE_MAGIC = b"RVMCTS\0\0"
+    FILE_VERSION = 2
+    _HEADER = struct.Struct("<8sIIQqQQd16sI")
+    _HEADER_V1 = struct.Struct("<8sIIQqQQd16s")
+    _HEADER_SIZE = 128
+    _FLAG_SYMMETRIC = 1
+
+    def __init__(self, n_rollouts=1, seed=None, exploration=math.sqrt(2), policy="ucb1", board_size=8,
+                 symmetric=False):
+        if policy not in self.POLICIES:
+            raise ValueError(
+                f"Unknown policy {policy}, expected one of {self.POLICIES}")
+        self.exploration = exploration
+        self.policy = policy
+        self.board_size = board_size
+        self.symmetric = symmetric
+        self._tree = MCTSTree()
+        self._root = self._tree.root
+        # The tree is the one of another MCTS (see view)
+        self._shared = False
         self._n_simulations = 0
+        self.n_rollouts = n_rollouts
+        # Separate streams for the expansions and the rollouts
+        seeds = random.Random(seed)
+        self._rng = random.Random(seeds.getrandbits(64))
+        self._rollout_engine = RolloutEngine(seeds.getrandbits(64))
+        self.stats = MCTSStats()
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # Trees saved before rollouts were done by RolloutEngine
+        if "_rollout_engine" not in state:
+            self.n_rollouts = 1
+            self._rollout_engine = RolloutEngine()
+        # Trees saved before the selection policy was configurable
+        self.__dict__.setdefault("exploration", math.sqrt(2))
+        self.__dict__.setdefault("policy", "ucb1")
+        self.__dict__.setdefault("board_size", 8)
+        self.__dict__.setdefault("symmetric", False)
+        self.__dict__.setdefault("stats", MCTSStats())
+        self.__dict__.setdefault("_shared", False)
+        # Trees saved as Node objects
+        if isinstance(self._root, Node):
+            self._tree = self._tree_from_nodes(self._root)
+            self._root = self._tree.root
+            self._rng = random.Random()
+
+    @staticmethod
+    def _tree_from_nodes(root):
+        "Copy a tree of (old) Node objects in an MCTSTree"
+        tree = MCTSTree()
+        tree.visits[tree.root] = root.n_visits
+        tree.values[tree.root] = root.value
+        pending = [(root, tree.root)]
+        while pending:
+            node, index = pending.pop()
+            if not node.children:
+                continue
+            actions, children = zip(*node.children.items())
+            codes = [MCTSTree.encode_move(ast.literal_eval(action))
+                     for action in actions]
+            first = tree.add_children(index, codes)
+            for i, child in enumerate(children):
+                tree.visits[first + i] = child.n_visits
+                tree.values[first + i] = child.value
+                pending.append((child, first + i))
+        tree.values_sq[:len(tree)] = tree.values[:len(tree)]
+        return tree
+
+    def get_tree(self):
+        return self._tree
 
     def get_n_simulations(self):
         return self._n_simulations
 
     def train(self, starting_board, n_episodes=1000, starting_node=None, verbose=True):
+        self.board_size = starting_board.get_board_size()
         for episode in range(1, n_episodes+1):
             self.mcts_one_iteraction(starting_board, starting_node)
             if verbose and episode % (n_episodes * 0.05) == 0:
-                print("Finished episode", episode, "/", n_episodes)
+                logger.info("Finished episode %d / %d", episode, n_episodes)
 
     def mcts_one_iteraction(self, board, starting_node=None):
         """
         Performs a round of Monte Carlo: https://en.wikipedia.org/wiki/Monte_Carlo_tree_search
+        Moves are played on board and cancelled before returning, board is left unchanged.
         """
-        board_copy = copy.deepcopy(board)
+        node = self._root if starting_node is None else starting_node
+        node, n_pushed = self.descend(node, board)
+
+        # Simulation
+        # Complete one random rollout from node C
+        stats = self.stats
+        start = time.perf_counter()
+        value = self.simulate(board)
+        simulated = time.perf_counter()
+        stats.simulation_time += simulated - start
+
+        # Backpropagation
+        # Use the result of the playout to update information in the nodes above
+        self.back_propagate(node, value)
+        stats.backprop_time += time.perf_counter() - simulated
+        stats.iterations += 1
+
+        # Rollback
+        for _ in range(n_pushed):
+            board.pop()
+
+    def descend(self, node, board):
+        """
+        Selection and expansion from node, board being its position. The moves
+        are played on board. Return the node to simulate, number of moves played.
+        """
+        n_pushed = 0
+        tree = self._tree
+        start = time.perf_counter()
 
         # Selection
         # Start from root R and select successive child nodes until a leaf node L is reached.
-        node = self._root if starting_node is None else starting_node
-        while not node.is_leaf():
+        while not tree.is_leaf(node):
             # Take ucb-directed action
-            action, node = node.select()
-            board_copy.push(action)
+            code, node = self.select(node)
+            board.push(MCTSTree.decode_move(code, board.get_next_player()))
+            n_pushed += 1
+        selected = time.perf_counter()
+        self.stats.selection_time += selected - start
 
         # Expansion :
         # Unless L ends the game decisively (e.g. win/loss/draw) for either player
         # create one (or more) child nodes and choose node C from one of them.
-        if not board_copy.is_game_over():
-            action, node = node.expand(board_copy.legal_moves())
-            board_copy.push(action)
-
-        # Simulation
-        # Complete one random rollout from node C
-        value = self.simulate(board_copy)
-
-        # Backpropagation
-        # Use the result of the playout to update information in the nodes above
-        node.back_propagate(value)
+        if not board.is_game_over():
+            code, node = self.expand(node, board)
+            board.push(MCTSTree.decode_move(code, board.get_next_player()))
+            n_pushed += 1
+        self.stats.expansion_time += time.perf_counter() - selected
+        return node, n_pushed
 
     def set_root(self, node):
         self._root = node
 
+    def promote(self, node):
+        "Make node the root, freeing the rest of the tree (copying it if shared). Return the new index of node"
+        self._tree = self._tree.compact(node)
+        self._root = self._tree.root
+        self._shared = False
+        return self._root
+
+    def prune(self, max_nodes):
+        "Drop the children of the least visited nodes until the tree has at most max_nodes nodes"
+        if len(self._tree) > max_nodes:
+            self._tree = self._tree.compact(self._root, max_nodes)
+            self._root = self._tree.root
+            self._shared = False
+
+    def is_shared(self):
+        "Whether the tree is still the one of the MCTS this one is a view of"
+        return self._shared
+
+    def _with_parameters(self, seed):
+        if seed is None:
+            seed = self._rng.getrandbits(64)
+        mcts = MCTS(self.n_rollouts, seed, self.exploration, self.policy,
+                    self.board_size, self.symmetric)
+        mcts._n_simulations = self._n_simulations
+        return mcts
+
+    def copy(self, seed=None):
+        "MCTS with the same parameters and a copy of the tree under the root (seeded by seed or by this MCTS)"
+        mcts = self._with_parameters(seed)
+        mcts._tree = self._tree.compact(self._root)
+        mcts._root = mcts._tree.root
+        return mcts
+
+    def view(self, seed=None):
+        """
+        MCTS with the same parameters sharing the tree of this one (seeded by
+        seed or by this MCTS). The tree must not be modified through the view
+        while is_shared(): promote copies the subtree of a node first.
+        """
+        mcts = self._with_parameters(seed)
+        mcts._tree = self._tree
+        mcts._root = self._root
+        mcts._shared = True
+        return mcts
+
+    def select(self, node):
+        "Child of node with the best UCB value. Return move code, child"
+        tree = self._tree
+        children = tree.children(node)
+        n_visits = tree.visits[children].astype(np.float64)
+        unvisited = np.flatnonzero(n_visits == 0)
+        if len(unvisited) > 0:
+            child = children.start + int(unvisited[0])
+            return int(tree.move[child]), child
+
+        log_parent = math.log(max(int(tree.visits[node]), 1))
+        values = tree.values[children]
+        # Children values are the results of the opponent
+        mean = 1 - values / n_visits
+        if self.policy == "ucb1":
+            ucb = mean + self.exploration * np.sqrt(log_parent / n_visits)
+        else:
+            # Mean of the squared results 1-r of the player choosing the child
+            mean_sq = (n_visits - 2 * values + tree.values_sq[children]) / n_visits
+            variance = mean_sq - mean**2 + np.sqrt(2 * log_parent / n_visits)
+            ucb = mean + np.sqrt(log_parent / n_visits * np.minimum(0.25, variance))
+        child = children.start + int(np.argmax(ucb))
+        return int(tree.move[child]), child
+
+    def expand(self, node, board):
+        "Create the children of node for the legal moves of board. Return move code, random child"
+        tree = self._tree
+        if tree.is_leaf(node):
+            moves = board.legal_moves()
+            if self.symmetric:
+                moves = Symmetry.unique_moves(board, moves)
+            tree.add_children(node, [MCTSTree.encode_move(move) for move in moves])
+        children = tree.children(node)
+        child = self._rng.randrange(children.start, children.stop)
+        return int(tree.move[child]), child
+
+    def back_propagate(self, node, value):
+        tree = self._tree
+        while node != MCTSTree.NO_NODE:
+            tree.visits[node] += 1
+            tree.values[node] += value
+            tree.values_sq[node] += value * value
+            # parent's node refers to opponent's action
+            value = 1 - value
+            node = tree.parent[node]
+
+    def add_statistics(self, node, visits, values, values_sq):
+        """
+        Add the results of visits simulations below node (values and values_sq
+        being the sums of the results and squared results for the player of
+        node) to node and its ancestors.
+        """
+        tree = self._tree
+        while node != MCTSTree.NO_NODE:
+            tree.visits[node] += visits
+            tree.values[node] += values
+            tree.values_sq[node] += values_sq
+            # Results 1-r for the parent
+            values, values_sq = visits - values, visits - 2 * values + values_sq
+            node = tree.parent[node]
+
+    def merge(self, other):
+        "Add the statistics and simulations of the tree of MCTS other (searched from the same position)"
+        self._tree.merge(other.get_tree(), self._root, other._root)
+        self._n_simulations += other.get_n_simulations()
+
+    def get_best_action(self, node, board):
+        "Get next action based on children values, board being the position of node. Return action, node"
+        tree = self._tree
+        if tree.is_leaf(node):
+            self.expand(node, board)
+        children = tree.children(node)
+        # Best action is the most visited one, then the one with minimal opponent mean value
+        n_visits = tree.visits[children]
+        most_visited = np.flatnonzero(n_visits == n_visits.max())
+        mean = tree.values[children][most_visited] / \
+            np.maximum(n_visits[most_visited], 1)
+        child = children.start + int(most_visited[np.argmin(mean)])
+        return MCTSTree.decode_move(tree.move[child], board.get_next_player()), child
+
+    def find_child_with_action(self, node, action, board):
+        "Child of node reached by action, board being the position of node (before action)"
+        tree = self._tree
+        if tree.is_leaf(node):
+            self.expand(node, board)
+        return tree.find_child(node, MCTSTree.encode_move(action))
+
+    def find_symmetric_child(self, node, action, board):
+        """
+        Child of node reached by action or, in a symmetric tree, by the image
+        of action by a symmetry t of board (the position of node). Return the
+        child and t (Symmetry.IDENTITY when action has its own child): the
+        position of the child is the image by t of board after action.
+        """
+        child = self.find_child_with_action(node, action, board)
+        if child != MCTSTree.NO_NODE or not self.symmetric:
+            return child, Symmetry.IDENTITY
+        size = board.get_board_size()
+        for t in Symmetry.symmetries(board):
+            child = self._tree.find_child(
+                node, MCTSTree.encode_move(Symmetry.transform_move(t, action, size)))
+            if child != MCTSTree.NO_NODE:
+                return child, t
+        return MCTSTree.NO_NODE, Symmetry.IDENTITY
+
     def simulate(self, board, limit=1000):
         """
-        Use the rollout policy to play until the end of the game,
-        returning +1 if the current player wins, 0 if the opponent wins,
-        and 0.5 if it is a tie.
+        Play random games until the end of the game, returning +1 if the current
+        player wins, 0 if the opponent wins, and 0.5 if it is a tie (averaged
+        over the n_rollouts games). The board is left unchanged.
         """
         current_player = board.get_next_player()
-        while not board.is_game_over():
-            action_probs = rollout_policy(board)
-            next_action = max(action_probs, key=itemgetter(1))[0]
-            board.push(next_action)
-
-        winner = board.get_winner()
+        black, white = board.get_bitboards()
+        size = board.get_board_size()
         self._n_simulations += 1
-        # tie
-        if winner == 0:
-            return 0.5
-        # current player wins
-        elif winner == current_player:
-            return 1
-        # current player loses
-        else:
-            return 0
+        moves_played = self._rollout_engine.moves_played
+        value = self._rollout(black, white, current_player, size)
+        self.stats.rollouts += self.n_rollouts
+        self.stats.rollout_moves += self._rollout_engine.moves_played - moves_played
+        return value
+
+    def _rollout(self, black, white, current_player, size):
+        "Mean result of current_player over n_rollouts random games"
+        if self.n_rollouts == 1:
+            winner = self._rollout_engine.play(
+                black, white, current_player, size)
+            # tie
+            if winner == 0:
+                return 0.5
+            # current player wins
+            elif winner == current_player:
+                return 1
+            # current player loses
+            else:
+                return 0
+
+        return self._rollout_engine.score(
+            black, white, current_player, self.n_rollouts, size) / self.n_rollouts
 
     def show(self, save_image=False):
         "Plot mcts using networkx and matplotlib"
@@ -168,24 +384,20 @@ class MCTS:
         from networkx.drawing.nx_agraph import graphviz_layout
 
         def build_graph():
-            def add_childs(graph, label_dict, node):
-
-                if node.is_leaf():
-                    return
-                if node.is_root:
-                    graph.add_node(id(node))
-                    label_dict[id(node)] = f"{node.value}/{node.n_visits}"
-                for child in node.children.items():
-                    child_node = child[1]
-                    graph.add_node(id(child_node))
-                    graph.add_edge(id(node), id(child_node))
-                    add_childs(graph, label_dict, child_node)
-                    label_dict[id(child_node)
-                               ] = f"{child_node.value}/{child_node.n_visits}"
-
+            tree = self._tree
             graph = nx.DiGraph()
             label_dict = {}
-            add_childs(graph, label_dict, self._root)
+            pending = [self._root]
+            while pending:
+                node = pending.pop()
+                graph.add_node(node)
+                label_dict[node] = f"{tree.values[node]}/{tree.visits[node]}"
+                if tree.is_leaf(node):
+                    continue
+                children = tree.children(node)
+                for child in range(children.start, children.stop):
+                    graph.add_edge(node, child)
+                    pending.append(child)
             return graph, label_dict
 
         graph, label_dict = build_graph()
@@ -197,75 +409,258 @@ class MCTS:
             plt.savefig('mcts.png')
         plt.show()
 
-    def save(self, path="mcts.pickle"):
+    def save(self, path="mcts.mcts"):
+        "Save the tree under the root and the parameters in the binary format of MCTS.load"
+        tree = self._tree
+        if self._root != tree.root:
+            tree = tree.compact(self._root)
+        with open(path, "wb") as file:
+            file.write(self._HEADER.pack(
+                self.FILE_MAGIC, self.FILE_VERSION, self.board_size, len(tree), tree.root,
+                self._n_simulations, self.n_rollouts, self.exploration, self.policy.encode(),
+                self._FLAG_SYMMETRIC if self.symmetric else 0))
+            file.write(bytes(self._HEADER_SIZE - self._HEADER.size))
+            tree.write_arrays(file)
+
+    def save_pickle(self, path="mcts.pickle"):
         "Save mcts object using joblib"
         import joblib
         joblib.dump(self, path, compress=4)
 
+    @staticmethod
+    def is_mcts_file(path):
+        "True if path is in the binary format of save"
+        with open(path, "rb") as file:
+            return file.read(len(MCTS.FILE_MAGIC)) == MCTS.FILE_MAGIC
+
+    @classmethod
+    def load(cls, path, mmap_mode="r", seed=None):
+        """
+        Load an MCTS saved by save. With mmap_mode "r" the tree is memory-mapped
+        read-only (instant and shared by the processes loading the same file,
+        but it must not be modified: search a copy, as MCTSPlayer does), with
+        "c" it is memory-mapped copy-on-write, with None it is read in memory.
+        """
+        with open(path, "rb") as file:
+            header = file.read(cls._HEADER_SIZE)
+        if len(header) < cls._HEADER.size or not header.startswith(cls.FILE_MAGIC):
+            raise ValueError(f"{path} is not an MCTS file")
+        version = cls._HEADER.unpack_from(header)[1]
+        if version == 1:
+            fields, flags = cls._HEADER_V1.unpack_from(header), 0
+        elif version == cls.FILE_VERSION:
+            *fields, flags = cls._HEADER.unpack_from(header)
+        else:
+            raise ValueError(
+                f"{path} has version {version} of the MCTS format, expected {cls.FILE_VERSION}")
+        (_magic, version, board_size, n_nodes, root, n_simulations, n_rollouts,
+         exploration, policy) = fields
+        mcts = cls(n_rollouts, seed, exploration, policy.rstrip(b"\0").decode(), board_size,
+                   bool(flags & cls._FLAG_SYMMETRIC))
+        mcts._tree = MCTSTree.read_arrays(path, cls._HEADER_SIZE, n_nodes, root, mmap_mode)
+        mcts._root = root
+        mcts._n_simulations = n_simulations
+        return mcts
 
-class MCTSPlayer(PlayerInterface):
-    """Reversi player based on MCTS"""
 
-    def __init__(self, color, mcts, board_size=8, max_time=120):
-        self._board = Reversi.Board(board_size)
+class MCTSPlayer(PlayerInterface):
+    """
+    Reversi player based on MCTS
+
+    Arguments:
+        n_workers: Number of processes searching (1 to search in this process)
+        parallel: Parallel mode when n_workers > 1, see ParallelMCTS
+        ponder: Keep growing the tree under the current node in the background
+            during the opponent's turn (in a thread: with main.play or Tournament,
+            the opponent runs in the same process and loses the time pondered)
+        max_nodes: Node budget of the tree, the children of the least visited
+            nodes are dropped after each move to stay under it (None for no limit)
+        book: OpeningBook whose moves are played without searching
+        stats_path: JSON lines file to which the statistics of the search of
+            each move (MCTSStats, kept in game_stats) are appended at the end of each game
+        seed: Seed of the copies of mcts searched in each game (None to draw
+            it from the generator of mcts)
+        budget: Iterations of each move instead of the time limit (see
+            WorkTimer), for reproducible games (n_workers must be 1 and ponder False)
+
+    Each game is played on a view of mcts: the moves follow its tree until
+    the first search (or a move leaving the tree), which copies the subtree
+    of the node reached. From then, after each move, the tree is re-rooted
+    at the node reached and the other branches are freed.
+
+    With a symmetric mcts, the node reached may be the one of a symmetric
+    position: the tree is searched on _tree_board, the image of the game board
+    by the symmetry _frame, and moves are mapped between both.
+    """
+
+    def __init__(self, color, mcts, board_size=8, max_time=120, bitboard=False,
+                 n_workers=1, parallel="root", ponder=False, max_nodes=None, book=None,
+                 stats_path=None, seed=None, budget=None):
+        if budget is not None and (n_workers > 1 or ponder):
+            raise ValueError("budget makes the search reproducible, it requires n_workers=1 and ponder=False")
+        self._bitboard = bitboard
+        self._board = Reversi.Board(board_size, bitboard=bitboard)
+        self.base_mcts = mcts
         self.mcts = mcts
+        self.max_nodes = max_nodes
+        self.book = book
+        self.stats_path = stats_path
         self.max_time = max_time
+        self.budget = budget
+        self.seed(seed)
+        self._parallel = None
+        if n_workers > 1:
+            from players.ParallelMCTS import ParallelMCTS
+            self._parallel = ParallelMCTS(mcts, n_workers, parallel)
+        self.ponder = ponder
+        self._ponderer = Ponderer()
         self.newGame(color)
 
     def getPlayerName(self):
         return "MCTS Player Jean-Claude Van Dam"
 
-    def _update_current_node_with_action(self, action):
-        new_current_node = self.current_node.find_child_with_action(action)
-        self._update_current_node(new_current_node)
+    def seed(self, seed):
+        "Seed the copies of mcts searched in the next games (None to draw their seeds from mcts)"
+        self._rng = None if seed is None else random.Random(seed)
+
+    def _play_tree_action(self, action):
+        "Play action (of the game board) on the tree board and move the current node to it"
+        size = self._board.get_board_size()
+        action = Symmetry.transform_move(self._frame, action, size)
+        if self.mcts.get_tree().is_leaf(self.current_node):
+            # The children are added to the tree
+            self._own_tree()
+        node, t = self.mcts.find_symmetric_child(self.current_node, action, self._tree_board)
+        # t leaves the tree board unchanged: its image after action is itself after t(action)
+        self._frame = Symmetry.compose(t, self._frame)
+        self._tree_board.push(Symmetry.transform_move(t, action, size))
+        self._update_current_node(node)
 
     def _update_current_node(self, node):
-        self.current_node = node
+        "Re-root the tree at node (only move to it while the tree is shared with base_mcts)"
+        if self.mcts.is_shared():
+            self.current_node = node
+            return
+        self._reroot(node)
+
+    def _reroot(self, node):
+        self.current_node = self.mcts.promote(node)
+        if self.max_nodes is not None:
+            self.mcts.prune(self.max_nodes)
+
+    def _own_tree(self):
+        "Copy the subtree of the current node from base_mcts before the tree is modified"
+        if self.mcts.is_shared():
+            self._reroot(self.current_node)
 
     def _play_mcts(self):
+        self._own_tree()
         start = time.time()
-        while not self.timer.out_of_time_for_turn():
+        if self._parallel is not None:
+            n_iterations = self._parallel.search(
+                self._tree_board, self.current_node, self.timer.get_time_left_for_turn() - 0.01)
+            # The rollouts of the workers are not seen by mcts
+            self.mcts.stats.iterations = n_iterations
+            self.mcts.stats.rollouts = self._parallel.rollouts
+        else:
+            n_iterations = 0
+            while not self.timer.out_of_time_for_turn():
+                self.mcts.mcts_one_iteraction(
+                    self._tree_board, starting_node=self.current_node)
+                n_iterations += 1
+        elapsed = time.time() - start
+        logger.info("MCTS took %.3f s, %d iterations/s", elapsed, n_iterations / max(elapsed, 1e-9))
+
+    def _ponder(self, should_stop):
+        "Iterations from the current node (opponent to play) until should_stop()"
+        n_iterations = 0
+        while not should_stop():
             self.mcts.mcts_one_iteraction(
-                self._board, starting_node=self.current_node)
-        print("MCTS took", time.time()-start)
+                self._tree_board, starting_node=self.current_node)
+            n_iterations += 1
+        logger.info("Pondered %d iterations", n_iterations)
 
     def getPlayerMove(self):
         if self._board.is_game_over():
-            print("Referee told me to play but the game is over!")
+            logger.warning("Referee told me to play but the game is over!")
             return (-1, -1)
 
+        self._ponderer.stop()
         self.timer.start_turn()
-        self._play_mcts()
-        action, node = self.current_node.get_best_action()
+        stats = self.mcts.stats = MCTSStats()
+        start = time.time()
+        action = self.book.probe(self._board) if self.book is not None else None
+        if action is not None:
+            logger.info("Book move %s", action)
+        else:
+            self._play_mcts()
+            action, _node = self.mcts.get_best_action(
+                self.current_node, self._tree_board)
+            action = Symmetry.transform_move(
+                Symmetry.inverse(self._frame), action, self._board.get_board_size())
+        self._play_tree_action(action)
         self._board.push(action)
-        self._update_current_node(node)
         self.timer.stop_turn()
-        print("I am playing ", action)
+        stats.time = time.time() - start
+        stats.move = list(action)
+        self.game_stats.append(stats)
+        logger.debug("I am playing %s", action)
         (c, x, y) = action
-        print("color:", self.color, " c:", c)
+        logger.debug("color: %s c: %s", self.color, c)
 
         assert(c == self.color)
-        print("My current board :")
-        print(self._board)
+        logger.debug("My current board :\n%s", self._board)
+        if self.ponder and not self._board.is_game_over():
+            # The pondering statistics are dropped
+            self.mcts.stats = MCTSStats()
+            self._own_tree()
+            self._ponderer.start(self._ponder)
         return (x, y)
 
     def playOpponentMove(self, x, y):
+        # The work done under the child reached by the move is kept
+        self._ponderer.stop()
         assert(self._board.is_valid_move(self._opponent, x, y))
-        print("Opponent played ", (x, y))
+        logger.debug("Opponent played %s", (x, y))
         action = [self._opponent, x, y]
+        self._play_tree_action(action)
         self._board.push(action)
-        self._update_current_node_with_action(action)
 
     def newGame(self, color):
-        self._board = Reversi.Board(self._board.get_board_size())
+        self._ponderer.stop()
+        self._board = Reversi.Board(
+            self._board.get_board_size(), bitboard=self._bitboard)
+        self._tree_board = Reversi.Board(
+            self._board.get_board_size(), bitboard=self._bitboard)
+        # Symmetry mapping the game board to the tree board
+        self._frame = Symmetry.IDENTITY
         self.color = color
         self._opponent = 1 if color == 2 else 2
+        self.mcts = self.base_mcts.view(None if self._rng is None else self._rng.getrandbits(64))
+        if self._parallel is not None:
+            self._parallel.mcts = self.mcts
         self.current_node = self.mcts._root
-        self.timer = Timer(max_time=self.max_time,
-                           max_n_turns=4+(self._board.get_board_size()**2)/2)
+        self.game_stats = []
+        self._game_start = time.time()
+        if self.budget is not None:
+            self.timer = WorkTimer(self.budget)
+        else:
+            self.timer = Timer(max_time=self.max_time,
+                               max_n_turns=4+(self._board.get_board_size()**2)/2)
 
     def endGame(self, winner):
+        self._ponderer.stop()
+        if self.stats_path is not None:
+            write_jsonl(self.stats_path, self.game_stats, player=self.getPlayerName(),
+                        color=self.color, winner=winner, game_start=self._game_start)
         if self.color == winner:
-            print("I won!!!")
+            logger.info("I won!!!")
         else:
-            print("I lost :(!!")
+            logger.info("I lost :(!!")
+
+    def close(self):
+        "Stop pondering and the ParallelMCTS workers"
+        self._ponderer.stop()
+        if self._parallel is not None:
+            self._parallel.close()
+            self._parallel = None
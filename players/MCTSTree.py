@@ -0,0 +1,264 @@
+import heapq
+import numpy as np
+
+
+class MCTSTree:
+    """
+    MCTS nodes stored in flat parallel NumPy arrays, a node being an index.
+
+    The children of a node are created together and are contiguous: they are
+    first_child[node], ..., first_child[node] + n_children[node] - 1.
+    Each node stores the move leading to it as a small integer code
+    (x*256+y, PASS for a pass, NO_MOVE for a root), see encode_move.
+
+    Arguments:
+        capacity: Number of nodes allocated at first, arrays grow as needed
+    """
+    PASS = -1
+    NO_MOVE = -2
+    NO_NODE = -1
+    # (name, dtype) of each array, values_sq being the sum of the squared values
+    _FIELDS = (("visits", np.uint32), ("values", np.float64), ("values_sq", np.float64),
+               ("parent", np.int32), ("first_child", np.int32), ("n_children", np.int16),
+               ("move", np.int16))
+
+    def __init__(self, capacity=1024):
+        self._n_nodes = 0
+        for name, dtype in self._FIELDS:
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+        self.root = self.add_root()
+
+    @staticmethod
+    def encode_move(move):
+        "Code of move [player, x, y]"
+        [_player, x, y] = move
+        if x == -1 and y == -1:
+            return MCTSTree.PASS
+        return x * 256 + y
+
+    @staticmethod
+    def decode_move(code, player):
+        "Move [player, x, y] of code"
+        if code == MCTSTree.PASS:
+            return [player, -1, -1]
+        return [player, int(code) // 256, int(code) % 256]
+
+    def __len__(self):
+        return self._n_nodes
+
+    def nbytes(self):
+        "Memory used by the nodes arrays, in bytes"
+        return sum(getattr(self, name).nbytes for name, _ in self._FIELDS)
+
+    def _allocate(self, n):
+        "Index of n new contiguous nodes, growing the arrays if needed"
+        first = self._n_nodes
+        if first + n > len(self.visits):
+            capacity = max(2 * len(self.visits), first + n)
+            for name, dtype in self._FIELDS:
+                array = np.zeros(capacity, dtype=dtype)
+                array[:first] = getattr(self, name)[:first]
+                setattr(self, name, array)
+        self._n_nodes += n
+        self.first_child[first:first + n] = self.NO_NODE
+        self.n_children[first:first + n] = 0
+        self.visits[first:first + n] = 0
+        self.values[first:first + n] = 0
+        self.values_sq[first:first + n] = 0
+        return first
+
+    def add_root(self):
+        node = self._allocate(1)
+        self.parent[node] = self.NO_NODE
+        self.move[node] = self.NO_MOVE
+        return node
+
+    def add_children(self, node, codes):
+        "Create the children of node, reached by the moves codes. Return the index of the first one"
+        n = len(codes)
+        first = self._allocate(n)
+        self.move[first:first + n] = codes
+        self.parent[first:first + n] = node
+        self.first_child[node] = first
+        self.n_children[node] = n
+        return first
+
+    def is_leaf(self, node):
+        return self.n_children[node] == 0
+
+    def is_root(self, node):
+        return self.parent[node] == self.NO_NODE
+
+    def children(self, node):
+        "Slice of the children of node"
+        first = int(self.first_child[node])
+        return slice(first, first + int(self.n_children[node]))
+
+    def find_child(self, node, code):
+        "Index of the child of node reached by code, NO_NODE if there is none"
+        if self.is_leaf(node):
+            return self.NO_NODE
+        children = self.children(node)
+        found = np.flatnonzero(self.move[children] == code)
+        if len(found) == 0:
+            return self.NO_NODE
+        return children.start + int(found[0])
+
+    def depth(self, node):
+        depth = 0
+        while not self.is_root(node):
+            node = self.parent[node]
+            depth += 1
+        return depth
+
+    def compact(self, node=None, max_nodes=None):
+        """
+        New tree made of the subtree of node (the root by default), node being
+        its root. With max_nodes, the children of the least visited nodes are
+        dropped (these nodes become leaves) so that it has at most max_nodes nodes.
+        """
+        node = self.root if node is None else node
+        if max_nodes is None:
+            return self._copy_subtree(node)
+        tree = MCTSTree(capacity=max_nodes)
+        for name, _ in self._FIELDS:
+            if name not in ("parent", "first_child", "n_children"):
+                getattr(tree, name)[tree.root] = getattr(self, name)[node]
+        # Expanded nodes (-visits, index here, index in tree), most visited first
+        pending = [(-int(self.visits[node]), node, tree.root)]
+        while pending:
+            _, old, new = heapq.heappop(pending)
+            if self.is_leaf(old):
+                continue
+            n = int(self.n_children[old])
+            if max_nodes is not None and len(tree) + n > max_nodes:
+                continue
+            children = self.children(old)
+            first = tree.add_children(new, self.move[children])
+            for name in ("visits", "values", "values_sq"):
+                getattr(tree, name)[first:first + n] = getattr(self, name)[children]
+            for i in range(n):
+                if not self.is_leaf(children.start + i):
+                    heapq.heappush(pending, (-int(self.visits[children.start + i]),
+                                             children.start + i, first + i))
+        return tree
+
+    def merge(self, other, node=None, other_node=None):
+        """
+        Add the statistics of the subtree of other_node in tree other (its root
+        by default) to the nodes reached by the same moves from node (the root
+        by default), creating the nodes expanded in other only. Subtrees never
+        visited in other are skipped.
+        """
+        pending = [(self.root if node is None else node,
+                    other.root if other_node is None else other_node)]
+        while pending:
+            node, other_node = pending.pop()
+            self.visits[node] += other.visits[other_node]
+            self.values[node] += other.values[other_node]
+            self.values_sq[node] += other.values_sq[other_node]
+            if other.is_leaf(other_node):
+                continue
+            other_children = other.children(other_node)
+            if self.is_leaf(node):
+                self.add_children(node, other.move[other_children])
+            children = self.children(node)
+            same_order = np.array_equal(self.move[children], other.move[other_children])
+            for other_child in range(other_children.start, other_children.stop):
+                if other.visits[other_child] == 0:
+                    continue
+                if same_order:
+                    child = children.start + other_child - other_children.start
+                else:
+                    child = self.find_child(node, other.move[other_child])
+                pending.append((child, other_child))
+
+    def filtered(self, keep, node=None):
+        """
+        New tree made of the subtree of node (the root by default) without the
+        nodes not in keep (a boolean array over the nodes) and their subtrees.
+        The children of a node are only partly copied when some are not in keep.
+        """
+        return self._copy_subtree(self.root if node is None else node, keep)
+
+    def _copy_subtree(self, node, keep=None):
+        """
+        compact without max_nodes, copying the subtree level by level with
+        NumPy: nodes are numbered in breadth-first order, which keeps the
+        children of each node contiguous.
+        """
+        levels = [np.array([node], dtype=np.int64)]
+        while True:
+            frontier = levels[-1]
+            counts = self.n_children[frontier].astype(np.int64)
+            total = int(counts.sum())
+            if total == 0:
+                break
+            # Concatenation of the ranges first_child .. first_child + n_children - 1
+            expanded = counts > 0
+            starts, counts = self.first_child[frontier][expanded].astype(np.int64), counts[expanded]
+            offsets = np.cumsum(counts) - counts
+            children = np.arange(total) + np.repeat(starts - offsets, counts)
+            if keep is not None:
+                children = children[keep[children]]
+            levels.append(children)
+        order = np.concatenate(levels)
+        new_index = np.full(len(self), self.NO_NODE, dtype=np.int64)
+        new_index[order] = np.arange(len(order))
+
+        tree = MCTSTree.__new__(MCTSTree)
+        tree._n_nodes = len(order)
+        tree.root = 0
+        for name, dtype in self._FIELDS:
+            setattr(tree, name, getattr(self, name)[order].astype(dtype))
+        tree.parent[1:] = new_index[self.parent[order[1:]]]
+        tree.parent[0] = self.NO_NODE
+        # The children copied of each node follow each other, from its first one
+        tree.n_children[:] = np.bincount(tree.parent[1:], minlength=len(order))
+        parents, first = np.unique(tree.parent[1:], return_index=True)
+        tree.first_child[:] = self.NO_NODE
+        tree.first_child[parents] = first + 1
+        return tree
+
+    def write_arrays(self, file):
+        "Write the arrays of the nodes to the binary file, each padded to a multiple of 8 bytes"
+        for name, dtype in self._FIELDS:
+            data = getattr(self, name)[:self._n_nodes].astype(np.dtype(dtype).newbyteorder("<"))
+            file.write(data.tobytes())
+            file.write(bytes(-data.nbytes % 8))
+
+    @classmethod
+    def read_arrays(cls, path, offset, n_nodes, root, mmap_mode="r"):
+        """
+        Tree of the n_nodes nodes written by write_arrays in the file path at offset.
+        With mmap_mode "r" (read-only) or "c" (copy-on-write), the arrays are
+        memory-mapped instead of read (None).
+        """
+        tree = cls.__new__(cls)
+        tree._n_nodes = n_nodes
+        tree.root = root
+        for name, dtype in cls._FIELDS:
+            dtype = np.dtype(dtype).newbyteorder("<")
+            if n_nodes == 0:
+                array = np.zeros(0, dtype=dtype)
+            elif mmap_mode is None:
+                array = np.fromfile(path, dtype=dtype, count=n_nodes, offset=offset)
+            else:
+                array = np.memmap(path, dtype=dtype, mode=mmap_mode, offset=offset, shape=(n_nodes,))
+            setattr(tree, name, array)
+            offset += n_nodes * dtype.itemsize
+            offset += -offset % 8
+        return tree
+
+    def __getstate__(self):
+        # Do not save the unused capacity
+        state = self.__dict__.copy()
+        for name, _ in self._FIELDS:
+            state[name] = state[name][:self._n_nodes].copy()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # Trees saved before values_sq: exact when all results are wins or losses
+        if "values_sq" not in state:
+            self.values_sq = self.values.copy()
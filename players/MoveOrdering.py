@@ -0,0 +1,120 @@
+class MoveOrdering:
+    """
+    Orders the moves searched by negAlphaBeta, so that alpha-beta cuts early.
+
+    Moves are sorted by source, in this order:
+        "tt": best move found by a previous (shallower) search of the position
+        "killers": moves that produced a cutoff at the same ply
+        "history": moves that produced cutoffs anywhere, weighted by depth
+        "static": static value of the square (corners first, X squares last)
+    Sources not listed in `sources` are ignored.
+
+    Arguments:
+        board_size: Size of the board
+        sources: Ordering sources to use
+        n_killers: Number of killer moves kept per ply
+    """
+    SOURCES = ("tt", "killers", "history", "static")
+
+    def __init__(self, board_size=8, sources=SOURCES, n_killers=2):
+        self.board_size = board_size
+        self.sources = tuple(sources)
+        self.n_killers = n_killers
+        self._square_values = self._get_square_values(board_size)
+        # Indexed by player, then by square x*board_size+y
+        self._history = [[0] * (board_size**2) for _ in range(3)]
+        self._killers = []
+        self.reset_stats()
+
+    @staticmethod
+    def _get_square_values(size):
+        "Classic positional weights: corners > edges > inner squares > squares next to corners"
+        last = size - 1
+        values = []
+        for x in range(size):
+            for y in range(size):
+                dx, dy = min(x, last - x), min(y, last - y)
+                if dx == 0 and dy == 0:
+                    value = 100  # corner
+                elif dx <= 1 and dy <= 1:
+                    value = -50 if dx == 1 and dy == 1 else -20  # X and C squares
+                elif dx == 0 or dy == 0:
+                    value = 10  # edge
+                elif dx == 1 or dy == 1:
+                    value = -5  # next to an edge
+                else:
+                    value = 1
+                values.append(value)
+        return values
+
+    def reset_stats(self):
+        self.stats = {"nodes": 0, "cutoffs": 0, "first_move_cutoffs": 0,
+                      "tt": 0, "killers": 0, "history": 0, "static": 0}
+
+    def new_search(self):
+        "Call before each move: forget killers, age history and reset statistics"
+        self._killers = []
+        for history in self._history:
+            for i in range(len(history)):
+                history[i] >>= 1
+        self.reset_stats()
+
+    def _get_killers(self, ply):
+        while len(self._killers) <= ply:
+            self._killers.append([])
+        return self._killers[ply]
+
+    def order(self, moves, ply, tt_move=None):
+        "Return moves sorted from most to least promising"
+        self.stats["nodes"] += 1
+        if len(moves) <= 1 or not self.sources:
+            return moves
+        use_tt = tt_move is not None and "tt" in self.sources
+        killers = self._get_killers(ply) if "killers" in self.sources else []
+        history = self._history[moves[0][0]] if "history" in self.sources else None
+        square_values = self._square_values if "static" in self.sources else None
+        size = self.board_size
+
+        def key(move):
+            if use_tt and move == tt_move:
+                return (3, 0, 0)
+            if move in killers:
+                return (2, -killers.index(move), 0)
+            square = move[1] * size + move[2]
+            return (1,
+                    history[square] if history is not None else 0,
+                    square_values[square] if square_values is not None else 0)
+
+        return sorted(moves, key=key, reverse=True)
+
+    def cutoff(self, move, ply, depth, index, tt_move=None):
+        "Record that move, searched in position index at ply with remaining depth, caused a cutoff"
+        self.stats["cutoffs"] += 1
+        if index == 0:
+            self.stats["first_move_cutoffs"] += 1
+        killers = self._get_killers(ply)
+        square = move[1] * self.board_size + move[2]
+        if move == tt_move:
+            self.stats["tt"] += 1
+        elif move in killers:
+            self.stats["killers"] += 1
+        elif self._history[move[0]][square] > 0:
+            self.stats["history"] += 1
+        else:
+            self.stats["static"] += 1
+
+        if move[1] == -1:  # pass
+            return
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[self.n_killers:]
+        self._history[move[0]][square] += depth * depth
+
+    def report(self):
+        "Statistics of the current search, with cutoff rates"
+        report = dict(self.stats)
+        nodes, cutoffs = self.stats["nodes"], self.stats["cutoffs"]
+        report["cutoff_rate"] = cutoffs / nodes if nodes else 0
+        report["first_move_cutoff_rate"] = self.stats["first_move_cutoffs"] / \
+            cutoffs if cutoffs else 0
+        return report
@@ -0,0 +1,157 @@
+import logging
+import numpy as np
+from copy import deepcopy
+import Reversi
+from players import Symmetry
+from players.MCTSTree import MCTSTree
+from players.Timer import FixedTimer
+
+logger = logging.getLogger(__name__)
+
+
+class OpeningBook:
+    """
+    Best moves of opening positions, keyed by their canonical (symmetry
+    reduced, see Symmetry) position, so that one entry serves the 8 symmetric
+    positions. Moves are stored in canonical coordinates.
+
+    Entries come from the visit statistics of a trained MCTS (add_mcts) and
+    from deep AlphaBeta searches (add_alphabeta), the latter replacing the
+    former. Players given a book play its move without searching.
+
+    Arguments:
+        board_size: Size of the board
+    """
+    SOURCE_MCTS = 0
+    SOURCE_ALPHABETA = 1
+
+    def __init__(self, board_size=8):
+        self.board_size = board_size
+        # (black, white, player) canonical key -> (square, score, weight, source)
+        self._entries = {}
+        self.hits = 0
+        self.probes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, board, move, score=0., weight=1., source=SOURCE_MCTS):
+        """
+        Record move [player, x, y] as the best move of board. An entry is only
+        replaced by one of a better source, or of the same source and a larger weight.
+        """
+        key, t = Symmetry.canonical_key(board)
+        _player, x, y = Symmetry.transform_move(t, move, self.board_size)
+        entry = self._entries.get(key)
+        if entry is None or (source, weight) >= (entry[3], entry[2]):
+            self._entries[key] = (x * self.board_size + y, score, weight, source)
+
+    def probe(self, board):
+        "Book move [player, x, y] of board, None if it is not in the book"
+        self.probes += 1
+        key, t = Symmetry.canonical_key(board)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        square = entry[0]
+        move = Symmetry.transform_move(Symmetry.inverse(t), [board.get_next_player(),
+                                       square // self.board_size, square % self.board_size],
+                                       self.board_size)
+        if not board.is_valid_move(*move):
+            return None
+        self.hits += 1
+        return move
+
+    def add_mcts(self, mcts, min_visits=100, max_depth=12):
+        """
+        Add the most visited move of each position of the mcts tree visited at
+        least min_visits times, up to max_depth moves from the root (the start position).
+        """
+        tree = mcts.get_tree()
+        board = Reversi.Board(self.board_size)
+        n_added = 0
+        pending = [(mcts._root, [])]
+        while pending:
+            node, moves = pending.pop()
+            if tree.is_leaf(node) or tree.visits[node] < min_visits or len(moves) > max_depth:
+                continue
+            for move in moves:
+                board.push(move)
+            children = tree.children(node)
+            best = children.start + int(np.argmax(tree.visits[children]))
+            player = board.get_next_player()
+            move = MCTSTree.decode_move(tree.move[best], player)
+            if move[1] != -1:
+                # Mean result of the move for the player
+                score = 1 - tree.values[best] / max(int(tree.visits[best]), 1)
+                self.add(board, move, score, int(tree.visits[best]), self.SOURCE_MCTS)
+                n_added += 1
+            for child in range(children.start, children.stop):
+                pending.append((child, moves + [MCTSTree.decode_move(tree.move[child], player)]))
+            for _ in moves:
+                board.pop()
+        logger.info("Added %d positions from MCTS, book size %d", n_added, len(self))
+
+    def add_alphabeta(self, max_plies=4, time_per_position=5, **player_kwargs):
+        """
+        Search with AlphaBetaPlayer(**player_kwargs) every canonical position
+        up to max_plies moves from the start, time_per_position seconds each.
+        """
+        from players.AlphaBetaPlayer import AlphaBetaPlayer
+        player = AlphaBetaPlayer(Reversi.Board._BLACK, self.board_size, **player_kwargs)
+        player.timer = FixedTimer(time_per_position)
+        level = [Reversi.Board(self.board_size)]
+        n_added = 0
+        for ply in range(max_plies + 1):
+            next_level, seen = [], set()
+            for board in level:
+                if board.is_game_over():
+                    continue
+                player._set_position(deepcopy(board), board.get_next_player())
+                # Stored values depend on the player color
+                if player.tt is not None:
+                    player.tt.clear()
+                player.timer.start_turn()
+                move = player.get_move()
+                if move[1] != -1:
+                    self.add(board, move, player._last_score or 0., player.depth,
+                             self.SOURCE_ALPHABETA)
+                    n_added += 1
+                if ply == max_plies:
+                    continue
+                for move in board.legal_moves():
+                    board.push(move)
+                    key, _ = Symmetry.canonical_key(board)
+                    if key not in seen:
+                        seen.add(key)
+                        next_level.append(deepcopy(board))
+                    board.pop()
+            logger.info("Ply %d: %d positions searched", ply, len(level))
+            level = next_level
+        logger.info("Added %d positions from AlphaBeta, book size %d", n_added, len(self))
+
+    def save(self, path="book.npz"):
+        "Save the book in a compressed NumPy archive"
+        keys = list(self._entries)
+        entries = [self._entries[key] for key in keys]
+        with open(path, "wb") as file:
+            np.savez_compressed(
+                file, board_size=self.board_size,
+                black=np.array([key[0] for key in keys], dtype=np.uint64),
+                white=np.array([key[1] for key in keys], dtype=np.uint64),
+                player=np.array([key[2] for key in keys], dtype=np.uint8),
+                square=np.array([entry[0] for entry in entries], dtype=np.uint8),
+                score=np.array([entry[1] for entry in entries], dtype=np.float64),
+                weight=np.array([entry[2] for entry in entries], dtype=np.float64),
+                source=np.array([entry[3] for entry in entries], dtype=np.uint8))
+
+    @classmethod
+    def load(cls, path="book.npz"):
+        with np.load(path) as data:
+            book = cls(int(data["board_size"]))
+            for black, white, player, square, score, weight, source in zip(
+                    data["black"].tolist(), data["white"].tolist(), data["player"].tolist(),
+                    data["square"].tolist(), data["score"].tolist(), data["weight"].tolist(),
+                    data["source"].tolist()):
+                book._entries[(black, white, player)] = (square, score, weight, source)
+        return book
@@ -0,0 +1,200 @@
+import multiprocessing
+import random
+import time
+from players.MCTSPlayer import MCTS
+from players.MCTSTree import MCTSTree
+from players.Rollout import RolloutEngine
+
+
+def _root_search(board, deadline, n_rollouts, exploration, policy, symmetric, seed):
+    "Worker of root parallelism: search board with a new tree until deadline, return its root statistics"
+    mcts = MCTS(n_rollouts, seed, exploration, policy, board.get_board_size(), symmetric)
+    n_iterations = 0
+    while time.time() < deadline or n_iterations == 0:
+        mcts.mcts_one_iteraction(board)
+        n_iterations += 1
+    tree = mcts.get_tree()
+    root = tree.root
+    children = tree.children(root)
+    return (tree.move[children].tolist(), tree.visits[children].tolist(),
+            tree.values[children].tolist(), tree.values_sq[children].tolist(),
+            int(tree.visits[root]), float(tree.values[root]), float(tree.values_sq[root]))
+
+
+def _rollouts(black, white, player, size, n_games, seed):
+    "Worker of tree and leaf parallelism: sum of the results of n_games random games for player"
+    return RolloutEngine(seed).score(black, white, player, n_games, size)
+
+
+class ParallelMCTS:
+    """
+    Runs the iterations of an MCTS on a pool of worker processes.
+
+    Modes:
+        "root": each worker grows its own tree from the searched position
+            until the deadline, then the visits and values of their root
+            children are added to the tree of mcts.
+        "tree": the tree of mcts is shared by the workers. The master selects
+            batch_size leaves, using a virtual loss (each selected path looks
+            like a loss to the player choosing it until its result comes back)
+            so that they differ, and the workers play their rollouts.
+        "leaf": iterations are sequential, but the batch_size rollouts of each
+            new node are split between the workers.
+
+    Arguments:
+        mcts: MCTS to update
+        n_workers: Number of worker processes (None for the number of cores)
+        mode: "root", "tree" or "leaf"
+        batch_size: Leaves per batch in "tree" mode (default 4*n_workers),
+            rollouts per leaf in "leaf" mode (default 32*n_workers)
+        seed: Seed of the workers random generators
+    """
+    MODES = ("root", "tree", "leaf")
+
+    def __init__(self, mcts, n_workers=None, mode="root", batch_size=None, seed=None):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown mode {mode}, expected one of {self.MODES}")
+        self.mcts = mcts
+        self.n_workers = n_workers or multiprocessing.cpu_count()
+        self.mode = mode
+        if batch_size is None:
+            batch_size = self.n_workers * (32 if mode == "leaf" else 4)
+        self.batch_size = batch_size
+        self._rng = random.Random(seed)
+        self._pool = multiprocessing.Pool(self.n_workers)
+        # Statistics of the last search
+        self.iterations = 0
+        self.rollouts = 0
+        self.elapsed = 0
+
+    def close(self):
+        self._pool.terminate()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _seed(self):
+        return self._rng.getrandbits(32)
+
+    def iterations_per_second(self):
+        "Iterations per second of the last search"
+        return self.iterations / self.elapsed if self.elapsed else 0
+
+    def search(self, board, node, max_time):
+        """
+        Run iterations from node, board being its position, for max_time seconds
+        (at least one batch is run). board is left unchanged. Return the number of iterations.
+        """
+        start = time.time()
+        deadline = start + max_time
+        if self.mode == "root":
+            self.iterations = self._root_parallel(board, node, deadline)
+            self.rollouts = self.iterations * self.mcts.n_rollouts
+        else:
+            self.iterations = self.rollouts = 0
+            while True:
+                if self.mode == "tree":
+                    self._tree_parallel_batch(board, node)
+                else:
+                    self._leaf_parallel_iteration(board, node)
+                if time.time() >= deadline:
+                    break
+        self.elapsed = time.time() - start
+        return self.iterations
+
+    def _root_parallel(self, board, node, deadline):
+        mcts = self.mcts
+        tree = mcts.get_tree()
+        tasks = [(board, deadline, mcts.n_rollouts, mcts.exploration, mcts.policy, mcts.symmetric,
+                  self._seed())
+                 for _ in range(self.n_workers)]
+        results = self._pool.starmap(_root_search, tasks)
+
+        if tree.is_leaf(node):
+            mcts.expand(node, board)
+        n_iterations = 0
+        for codes, visits, values, values_sq, root_visits, root_values, root_values_sq in results:
+            for code, child_visits, child_values, child_values_sq in zip(codes, visits, values, values_sq):
+                child = tree.find_child(node, code)
+                tree.visits[child] += child_visits
+                tree.values[child] += child_values
+                tree.values_sq[child] += child_values_sq
+            mcts.add_statistics(node, root_visits, root_values, root_values_sq)
+            n_iterations += root_visits
+        mcts._n_simulations += n_iterations
+        return n_iterations
+
+    def _virtual_loss(self, node, add=True):
+        "Add (or remove) a lost visit to node and its ancestors"
+        tree = self.mcts.get_tree()
+        while node != MCTSTree.NO_NODE:
+            if add:
+                tree.visits[node] += 1
+                tree.values[node] += 1
+                tree.values_sq[node] += 1
+            else:
+                tree.visits[node] -= 1
+                tree.values[node] -= 1
+                tree.values_sq[node] -= 1
+            node = tree.parent[node]
+
+    def _tree_parallel_batch(self, board, node):
+        mcts = self.mcts
+        size = board.get_board_size()
+        leaves, tasks = [], []
+        for _ in range(self.batch_size):
+            leaf, n_pushed = mcts.descend(node, board)
+            self._virtual_loss(leaf)
+            black, white = board.get_bitboards()
+            leaves.append(leaf)
+            tasks.append((black, white, board.get_next_player(), size,
+                          mcts.n_rollouts, self._seed()))
+            for _ in range(n_pushed):
+                board.pop()
+
+        results = self._pool.starmap(_rollouts, tasks)
+        for leaf, result in zip(leaves, results):
+            self._virtual_loss(leaf, add=False)
+            mcts.back_propagate(leaf, result / mcts.n_rollouts)
+        mcts._n_simulations += len(leaves)
+        self.iterations += len(leaves)
+        self.rollouts += len(leaves) * mcts.n_rollouts
+
+    def _leaf_parallel_iteration(self, board, node):
+        mcts = self.mcts
+        leaf, n_pushed = mcts.descend(node, board)
+        black, white = board.get_bitboards()
+        player, size = board.get_next_player(), board.get_board_size()
+        for _ in range(n_pushed):
+            board.pop()
+
+        n_games = [self.batch_size // self.n_workers + (i < self.batch_size % self.n_workers)
+                   for i in range(self.n_workers)]
+        tasks = [(black, white, player, size, n, self._seed()) for n in n_games if n > 0]
+        results = self._pool.starmap(_rollouts, tasks)
+        mcts.back_propagate(leaf, sum(results) / self.batch_size)
+        mcts._n_simulations += 1
+        self.iterations += 1
+        self.rollouts += self.batch_size
+
+
+def measure_scaling(board, worker_counts, mode="root", max_time=5, **mcts_kwargs):
+    """
+    Iterations per second of a search of board for each number of workers of
+    worker_counts, with a new MCTS(**mcts_kwargs) each time.
+    Return a list of dicts (n_workers, iterations, rollouts, iterations_per_second).
+    """
+    results = []
+    for n_workers in worker_counts:
+        mcts = MCTS(**mcts_kwargs)
+        with ParallelMCTS(mcts, n_workers, mode) as parallel:
+            parallel.search(board, mcts.get_tree().root, max_time)
+            results.append({"n_workers": n_workers,
+                            "iterations": parallel.iterations,
+                            "rollouts": parallel.rollouts,
+                            "iterations_per_second": parallel.iterations_per_second()})
+    return results
@@ -0,0 +1,30 @@
+import threading
+
+
+class Ponderer:
+    """
+    Runs a search in a background thread while the opponent thinks.
+    The search is a function taking a should_stop function, and must return
+    soon after should_stop() becomes true.
+    """
+
+    def __init__(self):
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self, search):
+        "Stop the running search if any, start search in the background"
+        self.stop()
+        self._stop.clear()
+        self._thread = threading.Thread(target=search, args=(self._stop.is_set,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        "Stop the running search and wait for it to return"
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def is_running(self):
+        return self._thread is not None
@@ -1,49 +1,63 @@
 # -*- coding: utf-8 -*-
 
 import time
+import logging
+import random
 import Reversi
-from random import randint
 from players.playerInterface import *
 
+logger = logging.getLogger(__name__)
+
 
 class RandomPlayer(PlayerInterface):
+    """
+    Plays uniformly random legal moves
+
+    Arguments:
+        seed: Seed of the random generator of the player (None for a random seed)
+    """
 
-    def __init__(self, color, board_size=8):
-        self._board = Reversi.Board(board_size)
+    def __init__(self, color, board_size=8, bitboard=False, seed=None):
+        self.seed(seed)
+        self._bitboard = bitboard
+        self._board = Reversi.Board(board_size, bitboard=bitboard)
         self.color = None
         self.newGame(color)
 
     def getPlayerName(self):
         return "Random Player Franky Vincent"
 
+    def seed(self, seed):
+        self._rng = random.Random(seed)
+
     def getPlayerMove(self):
         if self._board.is_game_over():
-            print("Referee told me to play but the game is over!")
+            logger.warning("Referee told me to play but the game is over!")
             return (-1, -1)
         moves = [m for m in self._board.legal_moves()]
-        move = moves[randint(0, len(moves)-1)]
+        move = moves[self._rng.randrange(len(moves))]
         self._board.push(move)
-        print("I am playing ", move)
+        logger.debug("I am playing %s", move)
         (c, x, y) = move
-        print("color:", self.color, " c:", c)
+        logger.debug("color: %s c: %s", self.color, c)
 
         assert(c == self.color)
-        print("My current board :")
-        print(self._board)
+        logger.debug("My current board :\n%s", self._board)
         return (x, y)
 
     def playOpponentMove(self, x, y):
         assert(self._board.is_valid_move(self._opponent, x, y))
-        print("Opponent played ", (x, y))
+        logger.debug("Opponent played %s", (x, y))
         self._board.push([self._opponent, x, y])
 
     def newGame(self, color):
-        self._board = Reversi.Board(self._board.get_board_size())
+        self._board = Reversi.Board(
+            self._board.get_board_size(), bitboard=self._bitboard)
         self.color = color
         self._opponent = 1 if color == 2 else 2
 
     def endGame(self, winner):
         if self.color == winner:
-            print("I won!!!")
+            logger.info("I won!!!")
         else:
-            print("I lost :(!!")
+            logger.info("I lost :(!!")
@@ -0,0 +1,115 @@
+import random
+import numpy as np
+import Reversi
+from Reversi import Board
+from players import BatchHeuristics
+
+
+class RolloutEngine:
+    """
+    Plays uniformly random games to the end on bitboards, without Board objects.
+    A player with no legal move passes, the game ends after two successive passes.
+
+    Arguments:
+        seed: Seed of the random generators (None for a random seed)
+    """
+    # From this number of games, score plays them at once with NumPy
+    # (below, the per-step NumPy overhead costs more than it saves)
+    BATCH_GAMES = 256
+    # Moves played in all the games (passes excluded)
+    moves_played = 0
+
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+        self.np_rng = np.random.default_rng(seed)
+
+    def play(self, black, white, player, size=8):
+        "Play a random game from the position, return the winner (Board._BLACK, Board._WHITE or 0 for a tie)"
+        rng = self.rng
+        own, opp = (black, white) if player == Board._BLACK else (white, black)
+        own_is_black = player == Board._BLACK
+        passes = 0
+        while passes < 2:
+            moves = Reversi.bitboard_moves(own, opp, size)
+            if moves:
+                passes = 0
+                self.moves_played += 1
+                # Uniform choice among the set bits of moves
+                for _ in range(rng.randrange(bin(moves).count("1"))):
+                    moves &= moves - 1
+                square = moves & -moves
+                flips = Reversi.bitboard_flips(own, opp, square, size)
+                own, opp = opp ^ flips, own | flips | square
+            else:
+                passes += 1
+                own, opp = opp, own
+            own_is_black = not own_is_black
+        return self._winner(own, opp, own_is_black)
+
+    def _winner(self, own, opp, own_is_black):
+        nb_own, nb_opp = bin(own).count("1"), bin(opp).count("1")
+        if nb_own == nb_opp:
+            return 0
+        if (nb_own > nb_opp) == own_is_black:
+            return Board._BLACK
+        return Board._WHITE
+
+    def score(self, black, white, player, n_games, size=8):
+        "Sum of the results of player over n_games random games (1 for a win, 0.5 for a tie)"
+        if size <= 8 and n_games >= self.BATCH_GAMES:
+            winners = self.play_many(black, white, player, n_games, size)
+        else:
+            winners = np.array([self.play(black, white, player, size)
+                                for _ in range(n_games)])
+        return float(np.sum(np.where(winners == 0, 0.5, winners == player)))
+
+    def play_many(self, black, white, player, n_games, size=8):
+        """
+        Play n_games random games from the same position at once with NumPy (boards up to 8x8).
+        Return an (n_games,) array of winners.
+        """
+        full, left, right = BatchHeuristics._get_shifts(size)
+        one = np.uint64(1)
+        own = np.full(n_games, black if player == Board._BLACK else white, dtype=np.uint64)
+        opp = np.full(n_games, white if player == Board._BLACK else black, dtype=np.uint64)
+        own_is_black = np.full(n_games, player == Board._BLACK)
+        passes = np.zeros(n_games, dtype=np.int64)
+        squares = np.arange(size * size, dtype=np.uint64)
+
+        active = passes < 2
+        while active.any():
+            moves = BatchHeuristics._moves(own, opp, size)
+            playing = active & (moves != 0)
+            self.moves_played += int(np.count_nonzero(playing))
+            passes = np.where(playing, 0, passes + active)
+
+            # Uniform choice among the legal moves: highest random weight
+            legal = ((moves[:, None] >> squares) & one).astype(bool)
+            weights = self.np_rng.random(legal.shape) * legal
+            square = np.where(playing, one << weights.argmax(axis=1).astype(np.uint64),
+                              np.uint64(0))
+
+            flips = np.zeros_like(own)
+            for shifts, shift_left in ((left, True), (right, False)):
+                for shift, mask in shifts:
+                    line = np.zeros_like(own)
+                    alive = playing.copy()
+                    x = ((square << shift) if shift_left else (square >> shift)) & mask
+                    for _ in range(size - 1):
+                        flips |= np.where(alive & ((x & own) != 0), line, np.uint64(0))
+                        alive &= (x & opp) != 0
+                        line |= np.where(alive, x, np.uint64(0))
+                        x = ((x << shift) if shift_left else (x >> shift)) & mask
+
+            new_own = np.where(playing, own | flips | square, own)
+            new_opp = np.where(playing, opp ^ flips, opp)
+            # The other player plays next in every game still running
+            own = np.where(active, new_opp, own)
+            opp = np.where(active, new_own, opp)
+            own_is_black = np.where(active, ~own_is_black, own_is_black)
+            active = passes < 2
+
+        nb_own = BatchHeuristics._popcount(own)
+        nb_opp = BatchHeuristics._popcount(opp)
+        black_wins = np.where(own_is_black, nb_own > nb_opp, nb_opp > nb_own)
+        return np.where(nb_own == nb_opp, 0, np.where(black_wins, Board._BLACK, Board._WHITE))
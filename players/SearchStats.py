@@ -0,0 +1,64 @@
+import json
+
+
+class SearchStats:
+    """
+    Statistics of the search of one move, filled in by the search players:
+    their game_stats attribute holds the ones of each move of the current
+    game, game_stats[-1] being the last one. Times are in seconds.
+    """
+    FIELDS = ("time",)
+
+    def __init__(self):
+        for name in self.FIELDS:
+            setattr(self, name, 0)
+        self.move = None
+
+    def to_dict(self):
+        stats = {"type": type(self).__name__, "move": self.move}
+        stats.update((name, getattr(self, name)) for name in self.FIELDS)
+        return stats
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()})"
+
+
+class AlphaBetaStats(SearchStats):
+    """
+    nodes: negAlphaBeta calls (and endgame solver nodes)
+    leaf_evaluations: heuristic evaluations of the leaves
+    cutoffs: beta cutoffs
+    tt_hits: positions found in the transposition table
+    depth: depth of the last iteration completed by iterative_deepening
+    movegen_time, heuristic_time: time spent generating moves and evaluating leaves
+    """
+    FIELDS = ("time", "nodes", "leaf_evaluations", "cutoffs", "tt_hits", "depth",
+              "movegen_time", "heuristic_time")
+
+
+class MCTSStats(SearchStats):
+    """
+    iterations: MCTS iterations
+    rollouts: random games played, rollout_moves: moves played in them
+    selection_time, expansion_time, simulation_time, backprop_time: time
+        spent in each step of the iterations
+    """
+    FIELDS = ("time", "iterations", "rollouts", "rollout_moves", "selection_time",
+              "expansion_time", "simulation_time", "backprop_time")
+
+    def mean_rollout_length(self):
+        return self.rollout_moves / self.rollouts if self.rollouts else 0
+
+    def to_dict(self):
+        stats = super().to_dict()
+        stats["mean_rollout_length"] = self.mean_rollout_length()
+        return stats
+
+
+def write_jsonl(path, game_stats, **fields):
+    "Append the stats of each move of game_stats to the JSON lines file path, with fields added to each line"
+    with open(path, "a") as file:
+        for index, stats in enumerate(game_stats):
+            line = dict(fields, index=index)
+            line.update(stats.to_dict())
+            file.write(json.dumps(line) + "\n")
@@ -0,0 +1,139 @@
+"""
+The 8 symmetries of the square board (rotations and reflections) on bitboards
+(square (x, y) being bit x*size+y, see Board.get_bitboards).
+
+Symmetry t maps square (x, y) to _SQUARE_MAPS[t](x, y, size). A position is
+canonical when its bitboards are the smallest ones among its 8 images, so that
+symmetric positions share the same canonical key.
+"""
+_SQUARE_MAPS = (
+    lambda x, y, n: (x, y),                  # identity
+    lambda x, y, n: (y, n - 1 - x),          # rotation by 90 degrees
+    lambda x, y, n: (n - 1 - x, n - 1 - y),  # rotation by 180 degrees
+    lambda x, y, n: (n - 1 - y, x),          # rotation by 270 degrees
+    lambda x, y, n: (n - 1 - x, y),          # horizontal reflection
+    lambda x, y, n: (x, n - 1 - y),          # vertical reflection
+    lambda x, y, n: (y, x),                  # transposition
+    lambda x, y, n: (n - 1 - y, n - 1 - x),  # anti-transposition
+)
+N_SYMMETRIES = len(_SQUARE_MAPS)
+IDENTITY = 0
+# Index of the inverse of each symmetry
+_INVERSES = (0, 3, 2, 1, 4, 5, 6, 7)
+
+
+def _compose_table():
+    "table[a][b]: symmetry applying b then a, found from the images of a square with 8 distinct images"
+    size, square = 8, (0, 1)
+    images = [_SQUARE_MAPS[t](*square, size) for t in range(N_SYMMETRIES)]
+    return tuple(tuple(images.index(_SQUARE_MAPS[a](*_SQUARE_MAPS[b](*square, size), size))
+                       for b in range(N_SYMMETRIES)) for a in range(N_SYMMETRIES))
+
+
+_COMPOSE = _compose_table()
+
+_row_tables = {}
+
+
+def _get_row_tables(size):
+    """
+    tables[t][x][row] is the image by t of the bitboard made of row (size bits)
+    in row x, so that a bitboard is transformed with one lookup per row.
+    """
+    if size not in _row_tables:
+        tables = []
+        for square_map in _SQUARE_MAPS:
+            images = [[0] * (1 << size) for _ in range(size)]
+            for x in range(size):
+                bits = [1 << (tx * size + ty)
+                        for tx, ty in (square_map(x, y, size) for y in range(size))]
+                table = images[x]
+                for row in range(1, 1 << size):
+                    low = row & -row
+                    # Image of row = image of its lowest bit | image of the others
+                    table[row] = table[row ^ low] | bits[low.bit_length() - 1]
+            tables.append(images)
+        _row_tables[size] = tables
+    return _row_tables[size]
+
+
+def inverse(t):
+    return _INVERSES[t]
+
+
+def compose(a, b):
+    "Symmetry applying b, then a"
+    return _COMPOSE[a][b]
+
+
+def transform_square(t, x, y, size):
+    "Image (x, y) of square (x, y) by symmetry t"
+    return _SQUARE_MAPS[t](x, y, size)
+
+
+def transform_move(t, move, size):
+    "Image of move [player, x, y] by symmetry t (passes are left unchanged)"
+    player, x, y = move
+    if x == -1 and y == -1:
+        return [player, x, y]
+    return [player, *_SQUARE_MAPS[t](x, y, size)]
+
+
+def transform_bitboard(t, bitboard, size):
+    "Image of bitboard by symmetry t"
+    images = _get_row_tables(size)[t]
+    mask = (1 << size) - 1
+    result = 0
+    for x in range(size):
+        row = (bitboard >> (x * size)) & mask
+        if row:
+            result |= images[x][row]
+    return result
+
+
+def canonical(black, white, size):
+    """
+    Canonical form of the position (black, white): return (black', white', t),
+    (black', white') being its smallest image, obtained by symmetry t.
+    """
+    best, best_t = (black, white), IDENTITY
+    for t in range(1, N_SYMMETRIES):
+        image = (transform_bitboard(t, black, size), transform_bitboard(t, white, size))
+        if image < best:
+            best, best_t = image, t
+    return best[0], best[1], best_t
+
+
+def canonical_key(board):
+    """
+    Key shared by board and its symmetric positions (with the same player to
+    play): return (key, t), board being mapped to the canonical position by t.
+    """
+    size = board.get_board_size()
+    black, white = board.get_bitboards()
+    black, white, t = canonical(black, white, size)
+    return (black, white, board.get_next_player()), t
+
+
+def symmetries(board):
+    "Symmetries t leaving board unchanged (the identity included)"
+    size = board.get_board_size()
+    black, white = board.get_bitboards()
+    return [t for t in range(N_SYMMETRIES)
+            if transform_bitboard(t, black, size) == black and
+            transform_bitboard(t, white, size) == white]
+
+
+def unique_moves(board, moves):
+    "moves without the ones that a symmetry of board maps to a previous one"
+    stabilizer = [t for t in symmetries(board) if t != IDENTITY]
+    if not stabilizer:
+        return moves
+    size = board.get_board_size()
+    seen, unique = set(), []
+    for move in moves:
+        if tuple(move) in seen:
+            continue
+        unique.append(move)
+        seen.update(tuple(transform_move(t, move, size)) for t in stabilizer)
+    return unique
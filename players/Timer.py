@@ -42,3 +42,67 @@ class Timer():
         res = self.total_time_left*math.exp(lamb*(self.max_n_turns-self.current_turn+1))/sum([math.exp(lamb*i)
                                                                                               for i in range(1, self.max_n_turns-self.current_turn+2)])
         return round(res, 3)
+
+    def should_stop_after(self, fraction):
+        "Function returning True once fraction of the time left for the turn is used"
+        deadline = time.time() + fraction * self.get_time_left_for_turn()
+        return lambda: time.time() > deadline
+
+
+class FixedTimer(Timer):
+    """
+    Timer giving the same time to every turn, for searches outside of a game
+    (opening book, benchmarks).
+
+    Arguments:
+        time_for_turn: Time (in s) of each turn
+    """
+
+    def __init__(self, time_for_turn):
+        super().__init__(max_time=math.inf, max_n_turns=1)
+        self.time_for_turn = time_for_turn
+        self.start_time_turn = time.time()
+
+    def get_time_for_turn(self):
+        return self.time_for_turn
+
+
+class WorkTimer():
+    """
+    Timer counting work instead of time, for reproducible games: each call to
+    out_of_time_for_turn uses one unit of the budget of the turn, so that a
+    search does the same work whatever the speed of the machine. Times are
+    then in units of work. MCTSPlayer checks the time once per iteration,
+    AlphaBetaPlayer after each child searched and each iteration of the deepening.
+
+    Arguments:
+        budget: Units of work of each turn
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.used = 0
+        self.current_turn = 0
+
+    def start_turn(self):
+        self.used = 0
+        self.current_turn += 1
+
+    def stop_turn(self):
+        pass
+
+    def get_time_left_for_turn(self):
+        return self.budget - self.used
+
+    def out_of_time_for_turn(self):
+        self.used += 1
+        return self.used > self.budget
+
+    def should_stop_after(self, fraction):
+        "Function returning True (each call using a unit) once fraction of the units left for the turn are used"
+        limit = self.used + fraction * (self.budget - self.used)
+
+        def should_stop():
+            self.used += 1
+            return self.used > limit
+        return should_stop
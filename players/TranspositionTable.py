@@ -0,0 +1,133 @@
+import multiprocessing
+import struct
+import numpy as np
+
+
+class TranspositionTable:
+    """
+    Fixed size transposition table indexed by the Zobrist hash of the board.
+
+    Each slot keeps one entry (key, depth, value, bound, best_move, generation).
+    Replacement is depth-preferred: an entry is only overwritten by a search at
+    least as deep, unless it was stored during a previous move (older generation).
+
+    Arguments:
+        size: Number of slots
+    """
+    EXACT = 0
+    LOWER = 1  # value is a lower bound (search failed high)
+    UPPER = 2  # value is an upper bound (search failed low)
+
+    def __init__(self, size=2**18):
+        self._size = size
+        self._entries = [None] * size
+        self._generation = 0
+        self.hits = 0
+        self.probes = 0
+
+    def new_search(self):
+        "Call before each move, older entries become replaceable"
+        self._generation += 1
+
+    def clear(self):
+        self._entries = [None] * self._size
+        self.hits = 0
+        self.probes = 0
+
+    def probe(self, key):
+        "Return the entry (key, depth, value, bound, best_move, generation) stored for key, or None"
+        self.probes += 1
+        entry = self._entries[key % self._size]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        return None
+
+    def store(self, key, depth, value, bound, best_move):
+        index = key % self._size
+        entry = self._entries[index]
+        if entry is None or entry[5] != self._generation or depth >= entry[1]:
+            self._entries[index] = (key, depth, value, bound,
+                                    best_move, self._generation)
+
+
+class SharedTranspositionTable(TranspositionTable):
+    """
+    TranspositionTable in shared memory, probed and written by several
+    processes at once without locks (see LazySMP).
+
+    Each slot holds three 64-bit words: the entry packed in data, the value,
+    and check = key ^ data ^ value bits, so that a slot torn by two processes
+    writing it at the same time is seen as a miss. Moves are [player, x, y]
+    with x, y < 255, or passes [player, -1, -1].
+
+    Arguments:
+        size: Number of slots
+    """
+
+    def __init__(self, size=2**18):
+        self._size = size
+        self._shared = (multiprocessing.RawArray("Q", size), multiprocessing.RawArray("Q", size),
+                        multiprocessing.RawArray("Q", size), multiprocessing.RawArray("Q", 1))
+        self._set_views()
+        self.hits = 0
+        self.probes = 0
+
+    def _set_views(self):
+        self._check, self._data, self._values, self._generations = (
+            np.frombuffer(array, dtype=np.uint64) for array in self._shared)
+
+    def __getstate__(self):
+        # Only possible when starting a process: the arrays are shared, not copied
+        state = self.__dict__.copy()
+        for name in ("_check", "_data", "_values", "_generations"):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._set_views()
+
+    @property
+    def _generation(self):
+        return int(self._generations[0])
+
+    def new_search(self):
+        self._generations[0] = (self._generation + 1) & 0xFFFFFFFF
+
+    def clear(self):
+        for array in (self._check, self._data, self._values):
+            array[:] = 0
+        self.hits = 0
+        self.probes = 0
+
+    def probe(self, key):
+        self.probes += 1
+        index = key % self._size
+        data, bits = int(self._data[index]), int(self._values[index])
+        if int(self._check[index]) ^ data ^ bits != key:
+            return None
+        self.hits += 1
+        # data: depth (8 bits), bound (2), move flag (1), player (2), x+1 (8), y+1 (8), generation (32)
+        move = None
+        if data >> 10 & 1:
+            move = [data >> 11 & 3, (data >> 13 & 0xFF) - 1, (data >> 21 & 0xFF) - 1]
+        value = struct.unpack("<d", bits.to_bytes(8, "little"))[0]
+        return (key, data & 0xFF, value, data >> 8 & 3, move, data >> 32)
+
+    def store(self, key, depth, value, bound, best_move):
+        index = key % self._size
+        data = int(self._data[index])
+        generation = self._generation
+        # The depth field has 8 bits: deeper entries only understate their depth
+        depth = min(depth, 0xFF)
+        if data >> 32 == generation and depth < data & 0xFF:
+            return
+        data = depth | bound << 8 | generation << 32
+        if best_move is not None:
+            player, x, y = best_move
+            data |= 1 << 10 | player << 11 | (x + 1) << 13 | (y + 1) << 21
+        bits = int.from_bytes(struct.pack("<d", value), "little")
+        self._data[index] = data
+        self._values[index] = bits
+        self._check[index] = key ^ data ^ bits
@@ -30,3 +30,7 @@ class PlayerInterface():
     def endGame(self, color):
         'You can get a feedback on the winner This function gives you the color of the winner'
         pass
+
+    def close(self):
+        'Frees the resources of the player (helper processes, background threads) once it has played its last game'
+        pass
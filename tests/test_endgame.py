@@ -0,0 +1,67 @@
+"""
+EndgameSolver against a plain negamax over the final disc difference.
+"""
+import functools
+import random
+import pytest
+import Reversi
+from players.EndgameSolver import EndgameSolver
+
+SIZE = 6
+
+
+@functools.lru_cache(maxsize=None)
+def _negamax(own, opp, passed=False):
+    "Final disc difference for own, own to play, searching every move"
+    size = SIZE
+    moves = Reversi.bitboard_moves(own, opp, size)
+    if not moves:
+        if passed:
+            return bin(own).count("1") - bin(opp).count("1")
+        return -_negamax(opp, own, True)
+    best = None
+    for square in range(size * size):
+        bit = 1 << square
+        if moves & bit:
+            flips = Reversi.bitboard_flips(own, opp, bit, size)
+            value = -_negamax(opp ^ flips, own | flips | bit)
+            best = value if best is None else max(best, value)
+    return best
+
+
+def _own_opp(board):
+    black, white = board.get_bitboards()
+    return (black, white) if board.get_next_player() == board._BLACK else (white, black)
+
+
+def _endgame_positions(n_positions=40, max_empties=10, seed=0):
+    "Positions of random games with at most max_empties empty squares, the game not over"
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < n_positions:
+        board = Reversi.Board(SIZE, bitboard=True)
+        empties = rng.randint(1, max_empties)
+        while not board.is_game_over() and SIZE * SIZE - board.get_total_coins() > empties:
+            board.push(rng.choice(board.legal_moves()))
+        if not board.is_game_over():
+            positions.append(board)
+    return positions
+
+
+# Wins, losses, a draw and a pass among them
+@pytest.mark.parametrize("board", _endgame_positions())
+def test_solve(board):
+    own, opp = _own_opp(board)
+    expected = _negamax(own, opp)
+    score, move = EndgameSolver(SIZE).solve(board)
+    assert score == expected
+    assert move[0] == board.get_next_player()
+    assert board.is_valid_move(*move)
+    board.push(move)
+    # The value of the position reached for the opponent
+    assert -_negamax(*_own_opp(board)) == expected
+
+
+def test_solve_stopped():
+    board = _endgame_positions(1, seed=1)[0]
+    assert EndgameSolver(SIZE, check_every=1).solve(board, lambda: True) == (None, None)
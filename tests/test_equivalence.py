@@ -0,0 +1,92 @@
+"""
+Random games checking that the fast paths agree with the reference ones:
+the bitboard backend with the list one, the Zobrist hash updated on
+push/pop with its recomputation, the memoized legal moves with a scan of
+the board, and the bitboard and batch heuristics with Heuristics.
+"""
+import random
+import numpy as np
+import pytest
+import Reversi
+from players import BatchHeuristics
+from players.Heuristics import Heuristics, BitboardHeuristics
+
+SIZES = (6, 8, 10)
+N_GAMES = 5
+
+
+def _random_games(size, n_games=N_GAMES, seed=0):
+    "Yield the (list board, bitboard) pairs of each position of n_games random games"
+    rng = random.Random(seed)
+    for _ in range(n_games):
+        board, bitboard = Reversi.Board(size), Reversi.Board(size, bitboard=True)
+        yield board, bitboard
+        while not board.is_game_over():
+            move = rng.choice(board.legal_moves())
+            board.push(move)
+            bitboard.push(move)
+            yield board, bitboard
+
+
+def _scanned_moves(board, player):
+    "Legal moves of player (a pass included) found by testing every square"
+    size = board.get_board_size()
+    moves = [[player, x, y] for x in range(size) for y in range(size)
+             if board.lazyTest_ValidMove(player, x, y)]
+    return moves or [[player, -1, -1]]
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_bitboard_moves(size):
+    for board, bitboard in _random_games(size):
+        assert bitboard.get_board() == board.get_board()
+        assert bitboard.get_bitboards() == board.get_bitboards()
+        assert bitboard.get_nb_coins() == board.get_nb_coins()
+        for player in ("default", "other"):
+            assert sorted(bitboard.legal_moves(player)) == sorted(board.legal_moves(player))
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("bitboard", (False, True))
+def test_hash(size, bitboard):
+    rng = random.Random(size)
+    board = Reversi.Board(size, bitboard=bitboard)
+    hashes = [board.get_hash()]
+    while not board.is_game_over():
+        board.push(rng.choice(board.legal_moves()))
+        assert board.get_hash() == board._compute_hash()
+        hashes.append(board.get_hash())
+    # pop restores the hash of each position
+    while board._stack:
+        hashes.pop()
+        board.pop()
+        assert board.get_hash() == hashes[-1] == board._compute_hash()
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("bitboard", (False, True))
+def test_legal_moves_cache(size, bitboard):
+    for positions in _random_games(size):
+        board = positions[bitboard]
+        next_player = board.get_next_player()
+        for player, opponent in (("default", next_player), ("other", board._flip(next_player))):
+            assert sorted(board.legal_moves(player)) == sorted(_scanned_moves(board, opponent))
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_heuristics(size):
+    positions, players, values = [], [], []
+    for board, bitboard in _random_games(size):
+        for player in (board._BLACK, board._WHITE):
+            opponent = board._flip(player)
+            value = Heuristics(board, player, opponent).total_heuristic()
+            assert BitboardHeuristics(board, player, opponent).total_heuristic() == pytest.approx(value)
+            assert BitboardHeuristics(bitboard, player, opponent).total_heuristic() == pytest.approx(value)
+            positions.append(board.get_bitboards())
+            players.append(player)
+            values.append(value)
+    if size <= 8:
+        # Positions in 64 bits only
+        batch = BatchHeuristics.total_heuristic(np.array(positions, dtype=np.uint64),
+                                                np.array(players), size)
+        np.testing.assert_allclose(batch, values)
@@ -0,0 +1,161 @@
+"""
+MCTS trees: the binary format of MCTS.save and MCTS.load, and the copies
+and merges of MCTSTree used between moves and by the training workers.
+"""
+import numpy as np
+import pytest
+import Reversi
+import Training
+from players.MCTSPlayer import MCTS
+from players.MCTSTree import MCTSTree
+
+
+def _trained(n_iterations=200, size=6, **kwargs):
+    mcts = MCTS(seed=0, board_size=size, **kwargs)
+    mcts.train(Reversi.Board(size), n_iterations, verbose=False)
+    return mcts
+
+
+def _statistics(tree, node=None):
+    "{moves path from node: (visits, values, values_sq)} of the subtree of node"
+    node = tree.root if node is None else node
+    statistics = {}
+    pending = [(node, ())]
+    while pending:
+        node, path = pending.pop()
+        statistics[path] = (int(tree.visits[node]), float(tree.values[node]),
+                            float(tree.values_sq[node]))
+        if not tree.is_leaf(node):
+            children = tree.children(node)
+            for child in range(children.start, children.stop):
+                pending.append((child, path + (int(tree.move[child]),)))
+    return statistics
+
+
+def _assert_same_tree(tree, expected):
+    assert len(tree) == len(expected)
+    assert tree.root == expected.root
+    for name, dtype in MCTSTree._FIELDS:
+        array = getattr(tree, name)[:len(tree)]
+        assert array.dtype == dtype, name
+        np.testing.assert_array_equal(array, getattr(expected, name)[:len(expected)], err_msg=name)
+
+
+def _assert_same_parameters(mcts, expected):
+    assert mcts.board_size == expected.board_size
+    assert mcts.n_rollouts == expected.n_rollouts
+    assert mcts.exploration == expected.exploration
+    assert mcts.policy == expected.policy
+    assert mcts.symmetric == expected.symmetric
+    assert mcts.get_n_simulations() == expected.get_n_simulations()
+
+
+@pytest.mark.parametrize("mmap_mode", ("r", None))
+@pytest.mark.parametrize("symmetric", (False, True))
+def test_save_load(tmp_path, mmap_mode, symmetric):
+    mcts = _trained(n_rollouts=2, policy="ucb1-tuned", symmetric=symmetric)
+    path = tmp_path / "tree.mcts"
+    mcts.save(path)
+    assert MCTS.is_mcts_file(path)
+    loaded = MCTS.load(path, mmap_mode)
+    _assert_same_parameters(loaded, mcts)
+    _assert_same_tree(loaded.get_tree(), mcts.get_tree())
+
+
+def test_load_version_1(tmp_path):
+    "Files of version 1, written before the header had flags, still load"
+    mcts = _trained()
+    tree = mcts.get_tree()
+    path = tmp_path / "tree_v1.mcts"
+    with open(path, "wb") as file:
+        file.write(MCTS._HEADER_V1.pack(
+            MCTS.FILE_MAGIC, 1, mcts.board_size, len(tree), tree.root, mcts.get_n_simulations(),
+            mcts.n_rollouts, mcts.exploration, mcts.policy.encode()))
+        file.write(bytes(MCTS._HEADER_SIZE - MCTS._HEADER_V1.size))
+        tree.write_arrays(file)
+    loaded = MCTS.load(path)
+    _assert_same_parameters(loaded, mcts)
+    _assert_same_tree(loaded.get_tree(), tree)
+
+
+def test_load_unknown_version(tmp_path):
+    path = tmp_path / "tree.mcts"
+    _trained(n_iterations=10).save(path)
+    with open(path, "r+b") as file:
+        file.seek(len(MCTS.FILE_MAGIC))
+        file.write((MCTS.FILE_VERSION + 1).to_bytes(4, "little"))
+    with pytest.raises(ValueError):
+        MCTS.load(path)
+
+
+def test_compact():
+    tree = _trained(500).get_tree()
+    node = tree.first_child[tree.root] + 1
+    compacted = tree.compact(node)
+    assert compacted.root == 0 and compacted.is_root(compacted.root)
+    assert _statistics(compacted) == _statistics(tree, node)
+    assert len(compacted) == len(_statistics(tree, node))
+
+
+def test_compact_max_nodes():
+    tree = _trained(500).get_tree()
+    compacted = tree.compact(max_nodes=len(tree) // 2)
+    assert len(compacted) <= len(tree) // 2
+    statistics = _statistics(tree)
+    kept = _statistics(compacted)
+    assert kept.items() <= statistics.items()
+
+
+def _worker_tree(mcts, n_iterations, seed):
+    "Tree of the iterations added to a copy of mcts, with the statistics of mcts subtracted"
+    worker = mcts.copy(seed)
+    tree = worker.get_tree()
+    n_base = len(tree)
+    base = [getattr(tree, name)[:n_base].copy() for name in Training._STATISTICS]
+    worker.train(Reversi.Board(mcts.board_size), n_iterations, verbose=False)
+    tree = worker.get_tree()
+    for name, array in zip(Training._STATISTICS, base):
+        getattr(tree, name)[:n_base] -= array
+    return tree, n_base
+
+
+def test_merge_filtered():
+    "Merging the visited part of a worker tree gives the master tree of merging all of it"
+    mcts = _trained(300)
+    tree, n_base = _worker_tree(mcts, 300, seed=1)
+    keep = tree.visits[:len(tree)] > 0
+    keep[n_base:] = True
+    filtered = tree.filtered(keep)
+    assert len(filtered) < len(tree)
+    master, filtered_master = mcts.copy(0).get_tree(), mcts.copy(0).get_tree()
+    master.merge(tree)
+    filtered_master.merge(filtered)
+    assert _statistics(filtered_master) == _statistics(master)
+    # The statistics of the kept nodes are copied unchanged
+    assert _statistics(filtered).items() <= _statistics(tree).items()
+
+
+def test_self_play(tmp_path):
+    mcts = _trained(300)
+    path = tmp_path / "checkpoint.mcts"
+    mcts.save(path)
+    added = Training._self_play(path, 300, mcts.board_size, False, seed=1)
+    assert added.get_n_simulations() == 300
+    assert added.get_tree().visits[added.get_tree().root] == 300
+    merged = MCTS.load(path, mmap_mode=None)
+    merged.merge(added)
+    assert merged.get_tree().visits[merged.get_tree().root] == 600
+    # The nodes expanded by the worker come with all their children
+    tree = merged.get_tree()
+    pending = [(tree.root, [])]
+    while pending:
+        node, moves = pending.pop()
+        if tree.is_leaf(node):
+            continue
+        board = Reversi.Board(mcts.board_size)
+        for code in moves:
+            board.push(MCTSTree.decode_move(code, board.get_next_player()))
+        assert tree.n_children[node] == len(board.legal_moves())
+        children = tree.children(node)
+        pending.extend((child, moves + [int(tree.move[child])])
+                       for child in range(children.start, children.stop))
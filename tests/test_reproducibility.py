@@ -0,0 +1,45 @@
+"""
+Games with a work budget and seeded generators are identical from one run to the next.
+"""
+import pytest
+import Reversi
+from main import play, quiet
+from players.AlphaBetaPlayer import AlphaBetaPlayer
+from players.MCTSPlayer import MCTS, MCTSPlayer
+from players.RandomPlayer import RandomPlayer
+
+SIZE = 6
+
+
+def _alphabeta(color):
+    return AlphaBetaPlayer(color, SIZE, budget=200)
+
+
+def _mcts(color):
+    return MCTSPlayer(color, MCTS(seed=0, board_size=SIZE), SIZE, budget=50, seed=1)
+
+
+def _moves(factory):
+    "Moves of a game of a new player of factory against a seeded RandomPlayer"
+    player = factory(Reversi.Board._BLACK)
+    opponent = RandomPlayer(Reversi.Board._WHITE, SIZE, seed=2)
+    moves = []
+    with quiet():
+        play(player, opponent, Reversi.Board(SIZE),
+             on_move=lambda move: moves.append((move["color"], move["x"], move["y"])))
+    return moves
+
+
+@pytest.mark.parametrize("factory", (_alphabeta, _mcts))
+def test_same_games(factory):
+    moves = _moves(factory)
+    assert len(moves) > 0
+    assert _moves(factory) == moves
+
+
+@pytest.mark.parametrize("kwargs", ({"n_workers": 2}, {"ponder": True}))
+def test_budget_rejected(kwargs):
+    with pytest.raises(ValueError):
+        AlphaBetaPlayer(Reversi.Board._BLACK, SIZE, budget=200, **kwargs)
+    with pytest.raises(ValueError):
+        MCTSPlayer(Reversi.Board._BLACK, MCTS(board_size=SIZE), SIZE, budget=50, **kwargs)